@@ -174,3 +174,101 @@ LOGGING = {
 OCR_MODELS = ['en', 'ar']
 VIDEO_FRAME_RATE = 2  # Process every 2 frames
 YOLO_MODEL = 'yolov8n.pt'
+
+# Video analysis worker
+# When enabled, uploads are queued for the long-lived `analysis_worker` command
+# (models stay loaded) instead of spawning one `analyze_video` process per upload.
+ANALYSIS_WORKER_ENABLED = os.environ.get('ANALYSIS_WORKER', 'False').lower() in ('1', 'true', 'yes')
+ANALYSIS_WORKER_POLL_INTERVAL = float(os.environ.get('ANALYSIS_WORKER_POLL_INTERVAL', '2'))
+
+# Frame decoding: 'sequential' (read forward, decode only sampled frames),
+# 'seek' (seek before every sample) or 'auto' (seek only when stride > GOP)
+ANALYSIS_DECODE_MODE = os.environ.get('ANALYSIS_DECODE_MODE', 'auto')
+
+# Sampled frames per vehicle-detector call. Larger batches amortize per-call
+# overhead; tune against the container CPU limit (cpus: '4', OMP_NUM_THREADS=4)
+ANALYSIS_BATCH_SIZE = int(os.environ.get('ANALYSIS_BATCH_SIZE', '8'))
+
+# Memory budget for candidate vehicle crops kept during a scan; the
+# lowest-scoring candidates are evicted when it is exceeded
+ANALYSIS_CANDIDATE_MEMORY_MB = int(os.environ.get('ANALYSIS_CANDIDATE_MEMORY_MB', '256'))
+
+# Sampled frames decoded ahead by the background decoder thread (bounded
+# queue, decoder blocks when inference falls behind). 0 decodes inline.
+ANALYSIS_DECODE_QUEUE_SIZE = int(os.environ.get('ANALYSIS_DECODE_QUEUE_SIZE', '16'))
+
+# Processes used to scan keyframe-aligned segments of a video in parallel
+# (each loads its own YOLO models). 1 scans the video in-process.
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', '1'))
+
+# Candidate crops kept per tracked vehicle; plate detection runs only on these
+ANALYSIS_TRACK_CANDIDATES = int(os.environ.get('ANALYSIS_TRACK_CANDIDATES', '3'))
+
+# Motion-adaptive sampling: frames are checked for motion (frame differencing
+# on small grayscale copies) at up to MAX fps and sent to the detector only
+# while something moves; static scenes are sampled at MIN fps (0 = skip them).
+# Set both to the same rate for fixed-rate sampling.
+ANALYSIS_MIN_SAMPLE_FPS = float(os.environ.get('ANALYSIS_MIN_SAMPLE_FPS', '0.2'))
+ANALYSIS_MAX_SAMPLE_FPS = float(os.environ.get('ANALYSIS_MAX_SAMPLE_FPS', '2'))
+# Fraction of changed pixels that counts as motion
+ANALYSIS_MOTION_THRESHOLD = float(os.environ.get('ANALYSIS_MOTION_THRESHOLD', '0.005'))
+
+# Per-camera regions of interest (pump lanes): JSON file mapping video filename
+# patterns to polygons/rectangles, see utils/roi.py. Missing file = full frame.
+ANALYSIS_ROI_CONFIG = os.environ.get('ANALYSIS_ROI_CONFIG', str(BASE_DIR / 'camera_roi.json'))
+
+# OCR cascade: passes run in this order and stop at the first result that
+# reaches its confidence threshold and has the KSA layout (3 letters + digits).
+# Passes: paddle_color, paddle_binary (recognition only, batched),
+# paddle_detect (text detection + recognition), easy_color, easy_binary
+ANALYSIS_OCR_PASSES = [
+    p.strip() for p in os.environ.get(
+        'ANALYSIS_OCR_PASSES', 'paddle_color,paddle_binary,paddle_detect,easy_color,easy_binary'
+    ).split(',') if p.strip()
+]
+ANALYSIS_OCR_ACCEPT_CONF = float(os.environ.get('ANALYSIS_OCR_ACCEPT_CONF', '0.85'))
+# Per-pass thresholds, e.g. "easy_color:0.7,easy_binary:0.7"
+ANALYSIS_OCR_PASS_CONF = {
+    name.strip(): float(conf)
+    for name, conf in (
+        item.split(':') for item in os.environ.get('ANALYSIS_OCR_PASS_CONF', '').split(',') if ':' in item
+    )
+}
+
+# Plates per PaddleOCR recognition batch (all plates of a video are read together)
+ANALYSIS_OCR_BATCH_SIZE = int(os.environ.get('ANALYSIS_OCR_BATCH_SIZE', '16'))
+
+# OCR result cache keyed by an exact hash of the plate crop, persisted as
+# JSON across worker restarts ('' disables it).
+ANALYSIS_OCR_CACHE_PATH = os.environ.get('ANALYSIS_OCR_CACHE_PATH', str(BASE_DIR / 'ocr_cache.json'))
+ANALYSIS_OCR_CACHE_SIZE = int(os.environ.get('ANALYSIS_OCR_CACHE_SIZE', '5000'))
+
+# Multi-frame plate reading: each plate is read from up to MAX_READS frames
+# (best first) until two reads agree, then fused by character voting. Extra
+# rounds stop once the per-video time budget (seconds) is used up.
+ANALYSIS_OCR_MAX_READS = int(os.environ.get('ANALYSIS_OCR_MAX_READS', '3'))
+ANALYSIS_OCR_TIME_BUDGET = float(os.environ.get('ANALYSIS_OCR_TIME_BUDGET', '10'))
+
+# Inference backend: 'torch' (PyTorch / Paddle) or 'onnx' (models exported
+# once to ANALYSIS_ONNX_DIR and run with onnxruntime). ONNX models can be
+# INT8-quantized: '' (none), 'dynamic' or 'static' (calibrated on sample frames).
+ANALYSIS_INFERENCE_BACKEND = os.environ.get('ANALYSIS_INFERENCE_BACKEND', 'torch')
+ANALYSIS_ONNX_QUANTIZATION = os.environ.get('ANALYSIS_ONNX_QUANTIZATION', '')
+ANALYSIS_ONNX_DIR = os.environ.get('ANALYSIS_ONNX_DIR', str(BASE_DIR / 'onnx_models'))
+
+# Processes that read plates while detection goes on (each loads its own
+# PaddleOCR / EasyOCR). Sized to at most half of the CPU quota; 0 (or a
+# single CPU) reads the plates in-process after the scan.
+ANALYSIS_OCR_WORKERS = int(os.environ.get('ANALYSIS_OCR_WORKERS', '1'))
+
+# Plate preprocessing before OCR: 'accurate' (non-local-means denoising,
+# angle classifier) or 'fast' (bilateral filter, no angle classifier).
+# Compare both with `python manage.py benchmark_preprocessing`.
+ANALYSIS_PLATE_PROFILE = os.environ.get('ANALYSIS_PLATE_PROFILE', 'accurate')
+
+# Analysis job progress (percent complete, stage) is written to the car at
+# most once per this many seconds while a video is analyzed.
+ANALYSIS_PROGRESS_INTERVAL = float(os.environ.get('ANALYSIS_PROGRESS_INTERVAL', '2'))
+# A running job whose state was not written for this many progress intervals
+# was killed (OOM, container restart) and is reported as failed.
+ANALYSIS_STALE_INTERVALS = int(os.environ.get('ANALYSIS_STALE_INTERVALS', '150'))
@@ -4,20 +4,42 @@ Admin configuration for cars and vehicles.
 from django.contrib import admin
 from apps.cars.models import Car
 from apps.vehicles.models import DetectedVehicle
+from utils.plate_normalizer import normalize_plate
+
+
+class PlateKeySearchMixin:
+    """Also match the search term against the normalized plate key."""
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        key = normalize_plate(search_term)
+        if key:
+            results |= queryset.filter(plate_key=key)
+        return results, may_have_duplicates
 
 
 @admin.register(Car)
-class CarAdmin(admin.ModelAdmin):
-    list_display = ['id', 'plate', 'paid', 'created_at', 'updated_at']
-    list_filter = ['paid', 'created_at']
+class CarAdmin(PlateKeySearchMixin, admin.ModelAdmin):
+    list_display = ['id', 'plate', 'paid', 'analysis_state', 'vehicle_count', 'analyzed_at', 'created_at', 'updated_at']
+    list_filter = ['paid', 'analysis_state', 'created_at']
     search_fields = ['plate']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = [
+        'vehicle_count', 'plates_detected', 'faces_detected', 'analyzed_at',
+        'analysis_progress', 'analysis_stage', 'analysis_error', 'analysis_started_at', 'analysis_finished_at',
+        'analysis_heartbeat_at', 'created_at', 'updated_at',
+    ]
     fieldsets = (
         ('Basic Info', {
             'fields': ('plate', 'paid', 'video')
         }),
         ('Analysis', {
-            'fields': ('analysis',)
+            'fields': ('analysis', 'vehicle_count', 'plates_detected', 'faces_detected', 'analyzed_at')
+        }),
+        ('Analysis Job', {
+            'fields': (
+                'analysis_state', 'analysis_progress', 'analysis_stage', 'analysis_error',
+                'analysis_started_at', 'analysis_finished_at', 'analysis_heartbeat_at',
+            )
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -27,7 +49,7 @@ class CarAdmin(admin.ModelAdmin):
 
 
 @admin.register(DetectedVehicle)
-class DetectedVehicleAdmin(admin.ModelAdmin):
+class DetectedVehicleAdmin(PlateKeySearchMixin, admin.ModelAdmin):
     list_display = ['id', 'video_id', 'plate_text', 'car_color', 'vehicle_confidence', 'created_at']
     list_filter = ['car_color', 'vehicle_confidence', 'created_at']
     search_fields = ['plate_text', 'video_id']
@@ -0,0 +1,759 @@
+"""
+Video analyzer for the Gas Station Monitoring system.
+
+Holds the YOLO and OCR models so they can be loaded once and reused across
+many videos (management command, analysis worker, API).
+Detects vehicles, license plates, car color and driver region, saves crops
+to car_crops/, plate_crops/, face_crops/ and creates DetectedVehicle records.
+"""
+import os
+import glob
+import json
+import logging
+from concurrent.futures import wait
+import cv2
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from apps.cars.inference import calibration_frames, load_yolo
+from apps.cars.jobs import AnalysisJob
+from apps.cars.models import Car
+from apps.cars.plate_reader import PlateReader, ocr_deadline
+from apps.vehicles.models import DetectedVehicle
+from utils.candidate_store import CandidateStore
+from utils.cpu_quota import available_cpus
+from utils.image_enhancement import PlateImageEnhancer, parallel_map
+from utils.plate_normalizer import normalize_plate
+from utils.roi import load_roi_config, roi_for_video
+from utils.frame_sampler import (
+    BackgroundIterator, FrameSampler, MotionSampler, batched, plan_segments, probe_gop_size, probe_keyframes,
+)
+from utils.vehicle_tracker import IoUTracker, link_track_spans
+
+logger = logging.getLogger(__name__)
+
+VIDEO_DIR = '/app/videos'
+CAR_CROPS_DIR = '/app/car_crops'
+PLATE_CROPS_DIR = '/app/plate_crops'
+FACE_CROPS_DIR = '/app/face_crops'
+VEHICLE_MODEL_PATH = '/app/yolov8n.pt'
+LICENSE_MODEL_PATH = '/app/best.pt'
+VEHICLE_CLASSES = ['car', 'truck', 'bus']
+VEHICLE_CROP_PADDING = 0.1
+TRACK_IOU_THRESHOLD = 0.3
+TRACK_MAX_AGE = 3
+
+
+class VideoAnalyzer:
+    """
+    Loads YOLO (vehicle + license plate) and the plate reader (PaddleOCR +
+    EasyOCR) once and analyzes any number of videos with them. With an OCR
+    pool the OCR models live in the pool's worker processes instead.
+    """
+
+    def __init__(self, batch_size=None, workers=None, load_ocr=True, ocr_workers=None):
+        self.batch_size = max(1, batch_size or settings.ANALYSIS_BATCH_SIZE)
+        self.workers = max(1, workers or settings.ANALYSIS_WORKERS)
+        self.segment_pool = None
+        self.ocr_pool = None
+        self.detect_cpus = available_cpus()
+
+        logger.info(f'[ANALYZE] Loading YOLO models ({settings.ANALYSIS_INFERENCE_BACKEND} backend)...')
+        self.yolo_vehicle = load_yolo(
+            VEHICLE_MODEL_PATH,
+            calibration=lambda: calibration_frames(VIDEO_DIR, os.path.join(settings.ANALYSIS_ONNX_DIR, 'calibration')),
+        )
+        self.yolo_license = load_yolo(
+            LICENSE_MODEL_PATH,
+            calibration=lambda: sorted(glob.glob(os.path.join(CAR_CROPS_DIR, '*.jpg'))),
+        )
+        logger.info('[ANALYZE] YOLO models loaded')
+
+        self.plate_reader = PlateReader()
+        if load_ocr:
+            ocr_workers, ocr_threads = self.ocr_pool_size(
+                settings.ANALYSIS_OCR_WORKERS if ocr_workers is None else ocr_workers
+            )
+            if ocr_workers:
+                self.start_ocr_pool(ocr_workers, ocr_threads)
+            else:
+                self.plate_reader.load()
+
+    def analyze(self, car):
+        """
+        Analyze a car's video and replace its DetectedVehicle records.
+        The job state (running / done / failed) and progress are stored on the car.
+        Returns the analysis summary, or {'error': ...} on failure.
+        """
+        job = AnalysisJob(car.id)
+        job.start()
+        try:
+            summary = self.run_analysis(car, job)
+        except Exception as e:
+            job.fail(e)
+            raise
+        if 'error' in summary:
+            job.fail(summary['error'])
+        return summary
+
+    def run_analysis(self, car, job):
+        """Analyze a car's video, reporting progress to `job` (see analyze)."""
+        video_path = os.path.join(VIDEO_DIR, car.video or '')
+        if not car.video or not os.path.exists(video_path):
+            logger.error(f'[ANALYZE] Video not found: {video_path}')
+            return {'error': f'Video not found: {video_path}'}
+
+        logger.info(f'[ANALYZE] Starting analysis for car {car.id}: {video_path}')
+
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            logger.error(f'[ANALYZE] Failed to open video: {video_path}')
+            return {'error': 'Failed to open video'}
+
+        # A vehicle is final once its track closes: pick its best frames and
+        # queue its plates for OCR while detection goes on
+        vehicles = []
+        ocr_jobs = []
+        # One OCR time budget for the whole video, shared by all OCR jobs. It
+        # starts with the first plates read: during the scan with the OCR
+        # pool, after it otherwise
+        deadline = None
+
+        def finish_tracks(track_items):
+            nonlocal deadline
+            finished = self.select_best_frames(track_items)
+            vehicles.extend(finished)
+            if deadline is None and self.ocr_pool is not None:
+                deadline = ocr_deadline()
+            ocr_jobs.append(self.submit_plates(finished, deadline))
+
+        job.enter('scanning')
+        try:
+            if self.workers > 1:
+                tracks, sampling = self.scan_video_parallel(cap, video_path, on_progress=job.progress)
+            else:
+                tracks, _, sampling = self.scan_video(
+                    cap, video_path, on_tracks_done=finish_tracks, on_progress=job.progress,
+                )
+        finally:
+            cap.release()
+
+        # Tracks still open at the end of the video (all tracks of a parallel scan)
+        finish_tracks(tracks.items())
+        vehicles.sort(key=lambda v: v['timestamp'])
+        retained = sum(v['crop'].nbytes + sum(p.nbytes for p in v['plate_crops']) for v in vehicles)
+        logger.info(
+            f'[ANALYZE] Found {len(vehicles)} unique vehicles (tracks), '
+            f'{retained / 1024 / 1024:.1f} MB of crops kept'
+        )
+
+        job.enter('saving_crops')
+        os.makedirs(CAR_CROPS_DIR, exist_ok=True)
+        os.makedirs(PLATE_CROPS_DIR, exist_ok=True)
+        os.makedirs(FACE_CROPS_DIR, exist_ok=True)
+
+        processed = []
+        idx = 0
+        for vdata in vehicles:
+            vehicle = self.process_vehicle(car, idx, vdata)
+            if vehicle is None:
+                continue
+            processed.append((vdata, vehicle))
+            idx += 1
+            job.progress(idx / len(vehicles))
+        self.save_driver_faces([vehicle for _, vehicle in processed])
+
+        # Wait for the OCR pool and read the remaining plates together (batched)
+        job.enter('reading_plates')
+        ocr_stats = self.read_plates(ocr_jobs, deadline or ocr_deadline(), on_progress=job.progress)
+        for vdata, vehicle in processed:
+            self.apply_reading(vehicle, vdata.get('reading'))
+        processed = [vehicle for _, vehicle in processed]
+
+        job.enter('saving')
+        summary = self.save_results(car, processed, {**sampling, **ocr_stats})
+        logger.info(f'[ANALYZE] ✅ Done: {summary}')
+        return summary
+
+    def close(self):
+        """Stop the segment and OCR worker processes, if any."""
+        if self.segment_pool is not None:
+            self.segment_pool.shutdown()
+            self.segment_pool = None
+        if self.ocr_pool is not None:
+            self.ocr_pool.shutdown()
+            self.ocr_pool = None
+
+    @staticmethod
+    def ocr_pool_size(requested):
+        """
+        OCR worker processes and threads per worker within the CPU quota.
+        OCR gets at most half of the CPUs so it doesn't oversubscribe the
+        cores YOLO runs on; with fewer than 2 CPUs there is no pool.
+        Returns (workers, threads); workers is 0 without a pool.
+        """
+        cpus = available_cpus()
+        if requested <= 0 or cpus < 2:
+            return 0, 0
+        workers = min(requested, cpus // 2)
+        return workers, max(1, cpus // 2 // workers)
+
+    def start_ocr_pool(self, workers, threads):
+        """Start the OCR pool and leave the remaining CPUs to detection."""
+        from apps.cars.ocr_pool import OCRPool
+
+        self.ocr_pool = OCRPool(workers, threads)
+        self.detect_cpus = max(1, available_cpus() - workers * threads)
+        try:
+            import torch
+            torch.set_num_threads(self.detect_cpus)
+        except ImportError:
+            pass
+
+    def new_candidate_store(self):
+        return CandidateStore(
+            settings.ANALYSIS_CANDIDATE_MEMORY_MB * 1024 * 1024,
+            per_key=settings.ANALYSIS_TRACK_CANDIDATES,
+        )
+
+    def sampling_strides(self, fps):
+        """
+        Frame strides for sampling at ANALYSIS_MAX_SAMPLE_FPS while there is
+        motion and at ANALYSIS_MIN_SAMPLE_FPS while the scene is static.
+        Returns (stride, idle_stride); idle_stride is None when static frames
+        are skipped entirely and equals stride when sampling is not adaptive.
+        """
+        fps = fps if fps > 0 else 1
+        stride = max(1, int(round(fps / settings.ANALYSIS_MAX_SAMPLE_FPS)))
+        if settings.ANALYSIS_MIN_SAMPLE_FPS <= 0:
+            return stride, None
+        return stride, max(stride, int(round(fps / settings.ANALYSIS_MIN_SAMPLE_FPS)))
+
+    def scan_video_parallel(self, cap, video_path, on_progress=None):
+        """
+        Split the video into keyframe-aligned segments, scan them in a process
+        pool and merge the per-segment tracks.
+        `on_progress` is called with the fraction of segments scanned.
+        Returns (tracks, sampling counters).
+        """
+        from apps.cars.parallel import SegmentPool
+
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        _, idle_stride = self.sampling_strides(cap.get(cv2.CAP_PROP_FPS))
+        segments = plan_segments(frame_count, self.workers, probe_keyframes(video_path))
+        if len(segments) < 2:
+            tracks, _, sampling = self.scan_video(cap, video_path, on_progress=on_progress)
+            return tracks, sampling
+
+        if self.segment_pool is None:
+            threads = max(1, self.detect_cpus // self.workers)
+            self.segment_pool = SegmentPool(self.workers, self.batch_size, threads)
+
+        logger.info(f'[ANALYZE] Scanning {len(segments)} segments in parallel: {segments}')
+
+        # Track IDs are per segment: prefix them with the segment, then link
+        # tracks that continue across a boundary to the same vehicle
+        tracks = self.new_candidate_store()
+        sampling = {'frames_analyzed': 0, 'frames_skipped': 0}
+        max_gap = idle_stride * (TRACK_MAX_AGE + 1) if idle_stride else frame_count
+        roots = {}
+        prev_spans = {}
+        results = self.segment_pool.scan(
+            video_path, segments,
+            on_done=(lambda done: on_progress(done / len(segments))) if on_progress else None,
+        )
+        for seg_idx, ((start, _), (segment_tracks, spans, counters)) in enumerate(zip(segments, results)):
+            for name, value in counters.items():
+                sampling[name] += value
+            spans = {f'{seg_idx}:{k}': span for k, span in spans.items()}
+            links = link_track_spans(
+                prev_spans, spans, start,
+                max_gap=max_gap,
+                iou_threshold=TRACK_IOU_THRESHOLD,
+            )
+            for key in spans:
+                roots[key] = roots[links[key]] if key in links else key
+            for key, candidates in segment_tracks:
+                for candidate in candidates:
+                    tracks.offer(roots[f'{seg_idx}:{key}'], candidate)
+            prev_spans = spans
+
+        return tracks, sampling
+
+    def scan_video(self, cap, video_path, start_frame=0, end_frame=None, on_tracks_done=None, on_progress=None):
+        """
+        Sample frames (more often while there is motion, see sampling_strides),
+        track vehicles across sampled frames and keep the best candidate crops
+        per track.
+        Sampled frames are decoded in a background thread and sent to the
+        vehicle detector in batches.
+        Only [start_frame, end_frame) is scanned when a segment is given.
+        When `on_tracks_done` is given, tracks closed by the tracker are
+        removed from the result and passed to it as (key, candidates) pairs
+        after each detector batch.
+        `on_progress` is called with the fraction of the frames scanned
+        (not at all when the video does not report its frame count).
+        Returns (tracks, track spans, sampling counters).
+        """
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        stride, idle_stride = self.sampling_strides(fps)
+        roi = self.camera_roi(cap, video_path)
+        sampler = FrameSampler(
+            cap,
+            stride,
+            frame_count=frame_count,
+            mode=settings.ANALYSIS_DECODE_MODE,
+            gop_size=probe_gop_size(video_path),
+            start_frame=start_frame,
+            end_frame=end_frame,
+        )
+
+        logger.info(
+            f'[ANALYZE] Video: {frame_count} frames, {fps:.1f} FPS, '
+            f'frames {sampler.start_frame}-{sampler.end_frame}, '
+            f'analyzing every {stride} frames, every {idle_stride} without motion '
+            f'({sampler.mode} decode, GOP={sampler.gop_size}, batch={self.batch_size})'
+        )
+        if roi is not None:
+            logger.info(f'[ANALYZE] Camera ROI: {len(roi.polygons)} region(s)')
+
+        # Candidate crops per vehicle track (crops only, bounded memory)
+        tracks = self.new_candidate_store()
+        tracker = IoUTracker(iou_threshold=TRACK_IOU_THRESHOLD, max_age=TRACK_MAX_AGE)
+
+        # Drop frames without motion before they reach the detector
+        motion = None
+        frames = sampler
+        if idle_stride != stride:
+            motion = MotionSampler(
+                sampler,
+                idle_stride=idle_stride,
+                motion_threshold=settings.ANALYSIS_MOTION_THRESHOLD,
+                hold_frames=int(fps),
+                roi=roi,
+            )
+            frames = motion
+
+        # Decode ahead in a background thread, run the vehicle detector once per batch
+        if settings.ANALYSIS_DECODE_QUEUE_SIZE > 0:
+            frames = BackgroundIterator(frames, maxsize=settings.ANALYSIS_DECODE_QUEUE_SIZE)
+
+        analyzed = 0
+        try:
+            for batch in batched(frames, self.batch_size):
+                analyzed += len(batch)
+                # Detect only inside the camera ROI (cropped + masked)
+                inputs = [roi.crop(frame) if roi else (frame, (0, 0)) for _, frame in batch]
+                results = self.yolo_vehicle([image for image, _ in inputs], conf=0.4, verbose=False)
+                for (frame_idx, frame), (_, offset), result in zip(batch, inputs, results):
+                    timestamp = frame_idx / fps if fps > 0 else 0
+                    self.update_candidates(tracks, tracker, frame_idx, frame, result, timestamp, roi, offset)
+                if on_tracks_done is not None:
+                    closed = [(key, tracks.pop(key)) for key in tracker.pop_closed() if key in tracks]
+                    if closed:
+                        on_tracks_done(closed)
+                # Streams of unknown length (no frame count) report no scan percentage
+                if on_progress is not None and sampler.end_frame is not None:
+                    span = max(1, sampler.end_frame - sampler.start_frame)
+                    on_progress((batch[-1][0] - sampler.start_frame + 1) / span)
+        finally:
+            if isinstance(frames, BackgroundIterator):
+                frames.close()
+
+        if isinstance(frames, BackgroundIterator):
+            logger.info(
+                f'[ANALYZE] Decoder waited {frames.producer_wait:.1f}s for inference, '
+                f'inference waited {frames.consumer_wait:.1f}s for decoder'
+            )
+
+        logger.info(
+            f'[ANALYZE] Candidate crops: peak {tracks.peak_bytes / 1024 / 1024:.1f} MB, '
+            f'{tracks.evicted} evicted'
+        )
+
+        sampling = {
+            'frames_analyzed': analyzed,
+            'frames_skipped': motion.frames_skipped if motion else 0,
+        }
+        if motion:
+            logger.info(
+                f'[ANALYZE] Motion sampling: {motion.frames_skipped} of {motion.frames_checked} '
+                f'frames skipped without motion'
+            )
+        return tracks, tracker.spans, sampling
+
+    def camera_roi(self, cap, video_path):
+        """
+        ROI of the camera that recorded the video, checked against the frame
+        size up front: an ROI that covers no pixel of the frame is ignored
+        (full frame) instead of failing the detector mid-video.
+        """
+        roi = roi_for_video(load_roi_config(settings.ANALYSIS_ROI_CONFIG), video_path)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if roi is not None and width > 0 and height > 0:
+            try:
+                roi.geometry((height, width))
+            except ValueError as e:
+                logger.warning(f'[ANALYZE] Ignoring camera ROI, using the full frame: {e}')
+                return None
+        return roi
+
+    def update_candidates(self, tracks, tracker, frame_idx, frame, result, timestamp, roi=None, offset=(0, 0)):
+        """
+        Assign one frame's vehicle detections to tracks and keep their best crops.
+        `offset` is the position of the detector input (ROI crop) in the frame;
+        vehicles whose center is outside the ROI are dropped.
+        """
+        frame_h, frame_w = frame.shape[:2]
+        off_x, off_y = offset
+
+        detections = []
+        for box in result.boxes:
+            class_id = int(box.cls)
+            if class_id not in result.names:
+                continue
+            if result.names[class_id] not in VEHICLE_CLASSES:
+                continue
+            x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
+            x1, y1, x2, y2 = x1 + off_x, y1 + off_y, x2 + off_x, y2 + off_y
+            if roi is not None and not roi.contains((x1 + x2) / 2, (y1 + y2) / 2, frame.shape):
+                continue
+            detections.append((float(box.conf), [x1, y1, x2, y2]))
+
+        track_ids = tracker.update([bbox for _, bbox in detections], frame_idx)
+
+        for (confidence, (x1, y1, x2, y2)), track_id in zip(detections, track_ids):
+            # Score: large, confident views give the most readable plates
+            score = confidence * (x2 - x1) * (y2 - y1) / float(frame_w * frame_h)
+            if not tracks.accepts(track_id, score):
+                continue
+
+            # Keep only the padded vehicle crop, not the full frame
+            pad_x = int((x2 - x1) * VEHICLE_CROP_PADDING)
+            pad_y = int((y2 - y1) * VEHICLE_CROP_PADDING)
+            cx1, cy1 = max(0, x1 - pad_x), max(0, y1 - pad_y)
+            cx2, cy2 = min(frame_w, x2 + pad_x), min(frame_h, y2 + pad_y)
+
+            tracks.offer(track_id, {
+                'score': score,
+                'bbox': [x1, y1, x2, y2],
+                'crop': frame[cy1:cy2, cx1:cx2].copy(),
+                'crop_bbox': [x1 - cx1, y1 - cy1, x2 - cx1, y2 - cy1],
+                'confidence': confidence,
+                'timestamp': timestamp,
+                'plate_conf': 0,
+                'plate_bbox': None,
+            })
+
+    def select_best_frames(self, track_items):
+        """
+        Run plate detection on each track's candidate crops and pick its best
+        frame. Frames where a plate is visible are preferred.
+        `track_items` are (track key, candidates) pairs.
+        Returns the best candidate per track, in order of appearance, with
+        'plate_crops': the track's plate crops, best first, for multi-frame OCR.
+        Only what process_vehicle uses is kept (see compact_vehicle).
+        """
+        best_frames = []
+        plate_calls = 0
+        for track_key, candidates in track_items:
+            for candidate in candidates:
+                self.detect_plate(candidate)
+                plate_calls += 1
+                candidate['plate_score'] = (1 if candidate['plate_conf'] > 0 else 0) * 10 + candidate['plate_conf'] + candidate['confidence'] * 0.1
+            candidates.sort(key=lambda c: c['plate_score'], reverse=True)
+
+            plate_crops = [crop for crop in (self.plate_crop(c) for c in candidates) if crop is not None]
+            best_frames.append(self.compact_vehicle(candidates[0], plate_crops))
+
+        logger.info(f'[ANALYZE] Plate detection on {plate_calls} crops for {len(best_frames)} tracks')
+        best_frames.sort(key=lambda c: c['timestamp'])
+        return best_frames
+
+    @staticmethod
+    def compact_vehicle(best, plate_crops):
+        """
+        Reduce a finished track to what process_vehicle uses: a copy of the
+        unpadded vehicle crop of its best candidate and copies of its plate
+        crops. Finished vehicles are kept until the end of the video, so they
+        must not hold on to the padded crops of all candidates (the plate
+        crops are views into them).
+        """
+        x1, y1, x2, y2 = best['crop_bbox']
+        crop = best['crop'][y1:y2, x1:x2].copy()
+        return {
+            'crop': crop,
+            'crop_bbox': [0, 0, crop.shape[1], crop.shape[0]],
+            'confidence': best['confidence'],
+            'timestamp': best['timestamp'],
+            'plate_conf': best['plate_conf'],
+            'plate_crops': [plate.copy() for plate in plate_crops],
+        }
+
+    def detect_plate(self, candidate):
+        """Find the best plate box in a candidate's vehicle crop (box is kept for the crop/OCR phase)."""
+        x1, y1, x2, y2 = candidate['crop_bbox']
+        car_crop = candidate['crop'][y1:y2, x1:x2]
+        if car_crop.size == 0:
+            return
+        try:
+            plate_results = self.yolo_license(car_crop, conf=0.25, verbose=False)
+            for pr in plate_results:
+                for pb in pr.boxes:
+                    pc = float(pb.conf)
+                    if pc > candidate['plate_conf']:
+                        candidate['plate_conf'] = pc
+                        candidate['plate_bbox'] = list(map(int, pb.xyxy[0].tolist()))
+        except Exception:
+            pass
+
+    @staticmethod
+    def plate_crop(candidate):
+        """Plate crop (padded by 10%) of a candidate, or None if it has no plate."""
+        if candidate['plate_bbox'] is None:
+            return None
+        x1, y1, x2, y2 = candidate['crop_bbox']
+        car_crop = candidate['crop'][y1:y2, x1:x2]
+        px1, py1, px2, py2 = candidate['plate_bbox']
+        pad_x = int((px2 - px1) * 0.1)
+        pad_y = int((py2 - py1) * 0.1)
+        px1 = max(0, px1 - pad_x)
+        py1 = max(0, py1 - pad_y)
+        px2 = min(car_crop.shape[1], px2 + pad_x)
+        py2 = min(car_crop.shape[0], py2 + pad_y)
+        crop = car_crop[py1:py2, px1:px2]
+        return crop if crop.size > 0 else None
+
+    def process_vehicle(self, car, idx, vdata):
+        """Save car, plate and driver crops for one vehicle and read its plate."""
+        x1, y1, x2, y2 = vdata['crop_bbox']
+        car_crop = vdata['crop'][y1:y2, x1:x2]
+        if car_crop.size == 0:
+            return None
+
+        # Save car crop (400x300)
+        crop_fn = f'car_{car.id}_v{idx}.jpg'
+        crop_resized = cv2.resize(car_crop, (400, 300), interpolation=cv2.INTER_AREA)
+        cv2.imwrite(os.path.join(CAR_CROPS_DIR, crop_fn), crop_resized)
+        logger.info(f'  [CAR] Saved {crop_fn}')
+
+        car_color = self.detect_color(car_crop)
+
+        plate_fn = None
+        plate_conf = None
+        best_pc = vdata['plate_conf']
+
+        # Reuse the plate boxes found after the scan instead of re-running the plate model
+        plate_crops = vdata.get('plate_crops') or []
+
+        if plate_crops:
+            plate_fn = f'plate_{car.id}_v{idx}.jpg'
+            plate_resized = cv2.resize(plate_crops[0], (200, 80), interpolation=cv2.INTER_CUBIC)
+            cv2.imwrite(os.path.join(PLATE_CROPS_DIR, plate_fn), plate_resized)
+            plate_conf = best_pc
+            logger.info(f'  [PLATE] Saved {plate_fn} (conf: {best_pc:.2f})')
+
+        # Driver region (right side for Saudi Arabia)
+        face_fn = None
+        ch, cw = car_crop.shape[:2]
+        dx1, dy1 = int(cw * 0.55), int(ch * 0.10)
+        dx2, dy2 = int(cw * 0.95), int(ch * 0.55)
+        driver_region = car_crop[dy1:dy2, dx1:dx2]
+
+        if driver_region.size > 0:
+            face_fn = f'face_{car.id}_v{idx}.jpg'
+
+        return {
+            'vehicle_index': idx,
+            'crop_image': crop_fn,
+            'plate_image': plate_fn,
+            'plate_text': None,
+            'car_color': car_color,
+            'driver_face_image': face_fn,
+            'driver_region': driver_region if face_fn else None,  # enhanced and saved by save_driver_faces
+            'vehicle_confidence': vdata['confidence'],
+            'plate_confidence': plate_conf,
+            'face_confidence': 1.0 if face_fn else None,
+            'timestamp': vdata['timestamp'],
+            'ocr_method': None,
+            'ocr_passes': 0,
+            'ocr_reads': 0,
+        }
+
+    def save_driver_faces(self, processed):
+        """Enhance (CLAHE on lightness) and save the driver regions of all vehicles in parallel."""
+        regions = [(v['driver_face_image'], v.pop('driver_region', None)) for v in processed]
+        regions = [(face_fn, region) for face_fn, region in regions if region is not None]
+        enhanced = PlateImageEnhancer.enhance_many([region for _, region in regions], method='color')
+
+        def save(item):
+            face_fn, face = item
+            driver_resized = cv2.resize(face, (200, 200), interpolation=cv2.INTER_AREA)
+            cv2.imwrite(os.path.join(FACE_CROPS_DIR, face_fn), driver_resized)
+            logger.info(f'  [DRIVER] Saved {face_fn}')
+
+        parallel_map(save, [(face_fn, face) for (face_fn, _), face in zip(regions, enhanced)])
+
+    def submit_plates(self, vehicles, deadline=None):
+        """
+        Queue the plates of finished vehicles for OCR. With the OCR pool they
+        are read in a worker process while the scan goes on, with no extra
+        reads after `deadline` (see PlateReader.read_vehicles); otherwise
+        they are read by read_plates after the scan.
+        Returns an OCR job: (vehicles, future or None).
+        """
+        future = None
+        if self.ocr_pool is not None and any(v['plate_crops'] for v in vehicles):
+            future = self.ocr_pool.submit([v['plate_crops'] for v in vehicles], deadline)
+        return vehicles, future
+
+    def read_plates(self, ocr_jobs, deadline=None, on_progress=None):
+        """
+        Gather the plate readings of all vehicles: wait for the OCR pool jobs
+        and read the plates of the other jobs together (batched OCR cascade +
+        character voting, several frames per vehicle, no extra reads after
+        `deadline`).
+        Each vehicle gets its fused 'reading' (or None).
+        `on_progress` is called with the fraction of pool jobs collected,
+        also every second while waiting for one.
+        Returns OCR cache counters for the summary.
+        """
+        stats = {'cache_hits': 0, 'cache_misses': 0}
+        deferred = []
+        pooled = sum(1 for _, future in ocr_jobs if future is not None)
+        collected = 0
+        for vehicles, future in ocr_jobs:
+            if future is None:
+                deferred.extend(vehicles)
+                continue
+            while on_progress is not None and not wait([future], timeout=1.0).done:
+                on_progress(collected / pooled)
+            collected += 1
+            try:
+                readings, job_stats = future.result()
+            except Exception as e:
+                logger.warning(f'[ANALYZE] OCR failed for {len(vehicles)} vehicles: {e}')
+                readings, job_stats = [None] * len(vehicles), {}
+            for vehicle, reading in zip(vehicles, readings):
+                vehicle['reading'] = reading
+            for name in stats:
+                stats[name] += job_stats.get(name, 0)
+            if on_progress is not None:
+                on_progress(collected / pooled)
+
+        if deferred:
+            readings, job_stats = self.plate_reader.read_vehicles(
+                [v['plate_crops'] for v in deferred], deadline=deadline,
+            )
+            for vehicle, reading in zip(deferred, readings):
+                vehicle['reading'] = reading
+            for name in stats:
+                stats[name] += job_stats[name]
+
+        for vehicles, _ in ocr_jobs:
+            for vehicle in vehicles:
+                vehicle.pop('plate_crops', None)
+        return {'ocr_cache_hits': stats['cache_hits'], 'ocr_cache_misses': stats['cache_misses']}
+
+    @staticmethod
+    def apply_reading(vehicle, reading):
+        """Store a fused plate reading on a processed vehicle."""
+        if reading is None:
+            return
+        vehicle['plate_text'] = reading['text']
+        vehicle['ocr_method'] = reading['method']
+        vehicle['ocr_passes'] = reading['passes']
+        vehicle['ocr_reads'] = reading['reads']
+        logger.info(f'  [OCR] Plate text (v{vehicle["vehicle_index"]}): {reading["text"]}')
+
+    def save_results(self, car, processed, extra=None):
+        """
+        Replace the car's DetectedVehicle records and store the summary (plus
+        `extra` counters), the car's analysis counters and the 'done' job
+        state. The old records are swapped for the new ones and the summary
+        is written in one transaction, so readers never see a partial result.
+        """
+        vehicles = [
+            DetectedVehicle(
+                video_id=car.id,
+                vehicle_index=v['vehicle_index'],
+                crop_image=v['crop_image'],
+                plate_image=v['plate_image'],
+                plate_text=v['plate_text'],
+                # bulk_create bypasses save(), which sets the key
+                plate_key=normalize_plate(v['plate_text']),
+                car_color=v['car_color'],
+                driver_face_image=v['driver_face_image'],
+                vehicle_confidence=v['vehicle_confidence'],
+                plate_confidence=v['plate_confidence'],
+                face_confidence=v['face_confidence'],
+                timestamp=v['timestamp'],
+            )
+            for v in processed
+        ]
+
+        summary = {
+            'vehicles_detected': len(processed),
+            'plates_detected': sum(1 for v in processed if v['plate_image']),
+            'faces_detected': sum(1 for v in processed if v['driver_face_image']),
+        }
+        # Winning OCR pass per plate and OCR passes run, to tune the cascade
+        ocr_methods = {}
+        for v in processed:
+            if v['ocr_method']:
+                ocr_methods[v['ocr_method']] = ocr_methods.get(v['ocr_method'], 0) + 1
+        summary['ocr_methods'] = ocr_methods
+        summary['ocr_passes'] = sum(v['ocr_passes'] for v in processed)
+        summary['ocr_reads'] = sum(v['ocr_reads'] for v in processed)
+        summary.update(extra or {})
+
+        with transaction.atomic():
+            # Lock the car row: concurrent analyses of one car write one after the other
+            Car.objects.select_for_update().filter(pk=car.pk).exists()
+            DetectedVehicle.objects.filter(video_id=car.id).delete()
+            DetectedVehicle.objects.bulk_create(vehicles, batch_size=500)
+            car.analysis = json.dumps(summary)
+            car.vehicle_count = summary['vehicles_detected']
+            car.plates_detected = summary['plates_detected']
+            car.faces_detected = summary['faces_detected']
+            car.analyzed_at = timezone.now()
+            car.analysis_state = Car.DONE
+            car.analysis_progress = 100
+            car.analysis_stage = ''
+            car.analysis_error = ''
+            car.analysis_finished_at = car.analyzed_at
+            # Only the analysis: a payment marked during the analysis is kept
+            car.save(update_fields=[
+                'analysis', 'vehicle_count', 'plates_detected', 'faces_detected', 'analyzed_at',
+                'analysis_state', 'analysis_progress', 'analysis_stage', 'analysis_error',
+                'analysis_finished_at', 'updated_at',
+            ])
+        return summary
+
+    @staticmethod
+    def detect_color(image):
+        """Detect dominant car color from crop."""
+        if image is None or image.size == 0:
+            return 'Unknown'
+        h, w = image.shape[:2]
+        center = image[int(h * 0.3):int(h * 0.7), int(w * 0.2):int(w * 0.8)]
+        if center.size == 0:
+            center = image
+        hsv = cv2.cvtColor(center, cv2.COLOR_BGR2HSV)
+        hsv_small = cv2.resize(hsv, (30, 30))
+        mh = float(np.mean(hsv_small[:, :, 0]))
+        ms = float(np.mean(hsv_small[:, :, 1]))
+        mv = float(np.mean(hsv_small[:, :, 2]))
+        if mv > 180 and ms < 40: return 'White'
+        if mv < 50: return 'Black'
+        if ms < 40 and 50 <= mv <= 180: return 'Silver/Gray'
+        if (mh < 10 or mh > 170) and ms > 50: return 'Red'
+        if 10 <= mh < 25 and ms > 50: return 'Orange'
+        if 25 <= mh < 35 and ms > 50: return 'Yellow'
+        if 35 <= mh < 85 and ms > 50: return 'Green'
+        if 85 <= mh < 130 and ms > 50: return 'Blue'
+        if 130 <= mh < 170 and ms > 50: return 'Purple'
+        return 'Unknown'
@@ -0,0 +1,90 @@
+"""
+Process-pool workers for the enhance_images command.
+
+Each worker reads a stored crop, hashes its content, and unless that content
+was already enhanced with the same method, writes the enhanced image next to
+the original (`<name>_enhanced.jpg`, `<name>_enhanced_<variant>.jpg` for the
+advanced variants). Originals are never overwritten.
+
+This module only imports the standard library at the top: worker processes
+are spawned fresh and only need OpenCV and utils.image_enhancement.
+"""
+import hashlib
+import os
+
+ENHANCED_SUFFIX = '_enhanced'
+
+# Per-process state, set by _init_worker
+_done = frozenset()
+_method = 'basic'
+_variant = 'enhanced'
+
+
+def derived_path(path, method='basic', variant='enhanced'):
+    """Path of the enhanced copy of an image (next to it), one per method."""
+    root, ext = os.path.splitext(path)
+    suffix = ENHANCED_SUFFIX if method == 'basic' else f'{ENHANCED_SUFFIX}_{variant}'
+    return f'{root}{suffix}{ext or ".jpg"}'
+
+
+def is_derived(path):
+    return ENHANCED_SUFFIX in os.path.splitext(os.path.basename(path))[0]
+
+
+def method_key(method, variant):
+    """Manifest key of an enhancement method ('basic' or 'advanced:<variant>')."""
+    return method if method == 'basic' else f'{method}:{variant}'
+
+
+def _init_worker(done, method, variant):
+    """Keep OpenCV single-threaded (the pool provides the parallelism) and store the job settings."""
+    global _done, _method, _variant
+    import cv2
+    cv2.setNumThreads(1)
+    _done, _method, _variant = frozenset(done), method, variant
+
+
+def _enhance_file(source):
+    """
+    Enhance one image unless its content was already processed.
+
+    Returns:
+        (status, source, output, sha256, seconds) with status 'done',
+        'skipped' or 'failed' (output holds the error message when failed)
+    """
+    import time
+    import cv2
+    import numpy as np
+    from utils.image_enhancement import PlateImageEnhancer
+
+    start = time.perf_counter()
+    output = derived_path(source, _method, _variant)
+    try:
+        with open(source, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in _done and os.path.exists(output):
+            return 'skipped', source, output, digest, time.perf_counter() - start
+
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError('unreadable image')
+        if _method == 'basic':
+            enhanced = PlateImageEnhancer.enhance_basic(image)
+        else:
+            result = PlateImageEnhancer.enhance_advanced(image, [_variant])
+            enhanced = result[_variant] if result else None
+        if enhanced is None:
+            raise ValueError('enhancement failed')
+
+        ok, encoded = cv2.imencode(os.path.splitext(output)[1], enhanced)
+        if not ok:
+            raise ValueError('encoding failed')
+        # Write atomically, an interrupted run never leaves a partial file
+        tmp_path = f'{output}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(encoded.tobytes())
+        os.replace(tmp_path, output)
+        return 'done', source, output, digest, time.perf_counter() - start
+    except Exception as e:
+        return 'failed', source, str(e), None, time.perf_counter() - start
@@ -0,0 +1,280 @@
+"""
+Inference backends for the video analyzer.
+
+- 'torch': YOLO .pt weights run with PyTorch (ultralytics), PaddleOCR with
+  Paddle inference.
+- 'onnx': the models are exported to ONNX once, cached in ANALYSIS_ONNX_DIR
+  and run with onnxruntime, optionally INT8-quantized: 'dynamic' (weights
+  only, no calibration) or 'static' (weights + activations, calibrated on
+  sample frames / crops).
+
+The backend is selected with ANALYSIS_INFERENCE_BACKEND. When onnxruntime or
+the exporters are not installed, models fall back to the torch backend.
+"""
+import contextlib
+import fcntl
+import glob
+import os
+import shutil
+import subprocess
+import logging
+import cv2
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TORCH = 'torch'
+ONNX = 'onnx'
+QUANTIZATIONS = ('', 'dynamic', 'static')
+
+YOLO_IMGSZ = 640
+CALIBRATION_IMAGES = 64
+
+
+def artifact_path(source_path, quantization=''):
+    """Cached ONNX artifact for a model file (one per quantization mode)."""
+    name = os.path.splitext(os.path.basename(source_path.rstrip('/')))[0]
+    suffix = f'.{quantization}-int8' if quantization else ''
+    return os.path.join(settings.ANALYSIS_ONNX_DIR, f'{name}{suffix}.onnx')
+
+
+def is_fresh(artifact, source_path):
+    """Whether a cached artifact exists and is newer than its source."""
+    return os.path.exists(artifact) and os.path.getmtime(artifact) >= os.path.getmtime(source_path)
+
+
+@contextlib.contextmanager
+def artifact_lock(target):
+    """
+    Exclusive lock on `target`.lock while an artifact is built. Processes
+    that start together (OCR pool workers) would otherwise export into the
+    same temp file; the ones that wait find the artifact fresh afterwards.
+    """
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(f'{target}.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # released when the file is closed
+        yield
+
+
+def load_yolo(weights_path, backend=None, quantization=None, calibration=None):
+    """
+    Load a YOLO model with the configured backend.
+
+    Args:
+        weights_path: Path to the .pt weights
+        backend: 'torch' or 'onnx' (default: ANALYSIS_INFERENCE_BACKEND)
+        quantization: '', 'dynamic' or 'static' (default: ANALYSIS_ONNX_QUANTIZATION)
+        calibration: Callable returning image paths for static quantization
+            (only called when a static model has to be built)
+
+    Returns:
+        ultralytics YOLO model (ultralytics runs .onnx files with onnxruntime)
+    """
+    from ultralytics import YOLO
+
+    backend = backend or settings.ANALYSIS_INFERENCE_BACKEND
+    quantization = settings.ANALYSIS_ONNX_QUANTIZATION if quantization is None else quantization
+    if backend != ONNX:
+        return YOLO(weights_path)
+
+    try:
+        onnx_path = export_yolo(weights_path)
+        if quantization:
+            target = artifact_path(weights_path, quantization)
+            images = calibration() if calibration and quantization == 'static' and not is_fresh(target, onnx_path) else None
+            onnx_path = quantize(onnx_path, quantization, images, target)
+        logger.info(f'[ANALYZE] {os.path.basename(weights_path)} -> {os.path.basename(onnx_path)} (onnxruntime)')
+        return YOLO(onnx_path, task='detect')
+    except Exception as e:
+        logger.warning(f'[ANALYZE] ONNX backend not available for {weights_path}, using torch: {e}')
+        return YOLO(weights_path)
+
+
+def export_yolo(weights_path):
+    """Export YOLO weights to ONNX once (dynamic batch and image size) and cache the file."""
+    target = artifact_path(weights_path)
+    if is_fresh(target, weights_path):
+        return target
+
+    from ultralytics import YOLO
+
+    with artifact_lock(target):
+        if is_fresh(target, weights_path):
+            return target  # exported by another process meanwhile
+        logger.info(f'[ANALYZE] Exporting {weights_path} to ONNX...')
+        exported = YOLO(weights_path).export(format='onnx', imgsz=YOLO_IMGSZ, dynamic=True, simplify=True)
+        shutil.move(exported, f'{target}.tmp')
+        os.replace(f'{target}.tmp', target)
+    return target
+
+
+def quantize(fp32_path, quantization, calibration_images=None, target=None):
+    """
+    INT8-quantize an ONNX model and cache the result.
+
+    Args:
+        fp32_path: ONNX model to quantize
+        quantization: 'dynamic' or 'static'
+        calibration_images: Image paths for 'static' (letterboxed to the model input)
+        target: Output path (default: next to fp32_path)
+
+    Returns:
+        Path to the quantized model
+    """
+    if quantization not in QUANTIZATIONS or not quantization:
+        raise ValueError(f'Unknown quantization: {quantization}')
+
+    import onnx
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    target = target or fp32_path.replace('.onnx', f'.{quantization}-int8.onnx')
+    if is_fresh(target, fp32_path):
+        return target
+
+    with artifact_lock(target):
+        if is_fresh(target, fp32_path):
+            return target
+        logger.info(f'[ANALYZE] Quantizing {os.path.basename(fp32_path)} ({quantization} INT8)...')
+        tmp_path = f'{target}.tmp'
+        if quantization == 'dynamic':
+            quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+        else:
+            if not calibration_images:
+                raise ValueError('Static quantization needs calibration images')
+            quantize_static(
+                fp32_path,
+                tmp_path,
+                ImageCalibrationReader(fp32_path, calibration_images),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+            )
+
+        # Keep the metadata (class names, stride, imgsz) ultralytics reads from the model
+        source, quantized = onnx.load(fp32_path), onnx.load(tmp_path)
+        del quantized.metadata_props[:]
+        quantized.metadata_props.extend(source.metadata_props)
+        onnx.save(quantized, tmp_path)
+        os.replace(tmp_path, target)
+    return target
+
+
+class ImageCalibrationReader:
+    """
+    onnxruntime CalibrationDataReader over sample images, letterboxed to a
+    YOLO input (1, 3, H, W) float32 in [0, 1].
+    """
+
+    def __init__(self, onnx_path, image_paths, imgsz=YOLO_IMGSZ):
+        import onnxruntime
+
+        session = onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+        self.input_name = session.get_inputs()[0].name
+        self.imgsz = imgsz
+        self.image_paths = list(image_paths)[:CALIBRATION_IMAGES]
+        self._iter = iter(self.image_paths)
+
+    def get_next(self):
+        for path in self._iter:
+            image = cv2.imread(path)
+            if image is not None:
+                return {self.input_name: self.letterbox(image)}
+        return None
+
+    def rewind(self):
+        self._iter = iter(self.image_paths)
+
+    def letterbox(self, image):
+        h, w = image.shape[:2]
+        scale = self.imgsz / max(h, w)
+        resized = cv2.resize(image, (int(round(w * scale)), int(round(h * scale))), interpolation=cv2.INTER_LINEAR)
+        canvas = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+        top = (self.imgsz - resized.shape[0]) // 2
+        left = (self.imgsz - resized.shape[1]) // 2
+        canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+        rgb = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB)
+        return (rgb.transpose(2, 0, 1)[None].astype(np.float32) / 255.0)
+
+
+def calibration_frames(video_dir, out_dir, count=CALIBRATION_IMAGES):
+    """
+    Write evenly spaced frames of the videos in `video_dir` as calibration
+    images for the vehicle detector. Returns the image paths.
+    """
+    existing = sorted(glob.glob(os.path.join(out_dir, '*.jpg')))
+    if existing:
+        return existing
+
+    videos = sorted(glob.glob(os.path.join(video_dir, '*')))
+    if not videos:
+        return []
+    os.makedirs(out_dir, exist_ok=True)
+    per_video = max(1, count // len(videos))
+    paths = []
+    for n, video_path in enumerate(videos):
+        cap = cv2.VideoCapture(video_path)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        for frame_idx in np.linspace(0, max(0, frame_count - 1), per_video).astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_idx))
+            ret, frame = cap.read()
+            if ret:
+                path = os.path.join(out_dir, f'v{n}_{frame_idx}.jpg')
+                cv2.imwrite(path, frame)
+                paths.append(path)
+        cap.release()
+    return paths
+
+
+def paddle_ocr_options(paddle_ocr, quantization=None):
+    """
+    Export a loaded PaddleOCR's text detector, angle classifier and
+    recognizer to ONNX (cached) and return the PaddleOCR options that run
+    them with onnxruntime. PaddleOCR's ONNX mode needs all three models.
+
+    Static quantization needs calibration data in the recognizer's input
+    format, so OCR models only support 'dynamic' INT8.
+
+    Args:
+        paddle_ocr: PaddleOCR instance (its models are downloaded)
+        quantization: '' or 'dynamic' (default: ANALYSIS_ONNX_QUANTIZATION)
+
+    Returns:
+        Dict of PaddleOCR keyword arguments (use_onnx + model paths)
+    """
+    quantization = settings.ANALYSIS_ONNX_QUANTIZATION if quantization is None else quantization
+    if quantization == 'static':
+        logger.info('[ANALYZE] OCR models use dynamic INT8 (static needs recognizer calibration data)')
+        quantization = 'dynamic'
+
+    options = {'use_onnx': True}
+    for name in ('det', 'cls', 'rec'):
+        model_dir = getattr(paddle_ocr.args, f'{name}_model_dir')
+        onnx_path = export_paddle(model_dir, f'paddle_{name}')
+        if quantization and name == 'rec':
+            onnx_path = quantize(onnx_path, quantization)
+        options[f'{name}_model_dir'] = onnx_path
+    return options
+
+
+def export_paddle(model_dir, name):
+    """Convert a Paddle inference model directory to ONNX with paddle2onnx (cached)."""
+    model_file = os.path.join(model_dir, 'inference.pdmodel')
+    target = os.path.join(settings.ANALYSIS_ONNX_DIR, f'{name}_{os.path.basename(model_dir.rstrip("/"))}.onnx')
+    if is_fresh(target, model_file):
+        return target
+
+    with artifact_lock(target):
+        if is_fresh(target, model_file):
+            return target
+        logger.info(f'[ANALYZE] Exporting {model_dir} to ONNX...')
+        subprocess.run([
+            'paddle2onnx',
+            '--model_dir', model_dir,
+            '--model_filename', 'inference.pdmodel',
+            '--params_filename', 'inference.pdiparams',
+            '--save_file', f'{target}.tmp',
+            '--opset_version', '11',
+        ], check=True, capture_output=True)
+        os.replace(f'{target}.tmp', target)
+    return target
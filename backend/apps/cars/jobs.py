@@ -0,0 +1,112 @@
+"""
+Analysis job state.
+
+The state of a car's analysis (queued / running / done / failed), its
+percent complete, current stage, error and start/end times are stored on
+the Car row so clients polling analysis_status know when to stop. Progress
+is written at most every ANALYSIS_PROGRESS_INTERVAL seconds, and at least
+that often while the job runs (heartbeat). A running job without a write
+for ANALYSIS_STALE_INTERVALS intervals was killed and is marked failed.
+"""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from apps.cars.models import Car
+
+# Stage -> percent complete when it starts. Scanning the video takes most of the time.
+STAGES = {
+    'scanning': 0,
+    'saving_crops': 80,
+    'reading_plates': 90,
+    'saving': 97,
+}
+
+STALE_ERROR = 'Interrupted: the analysis stopped reporting progress (process killed?)'
+
+
+def stale_cutoff():
+    """Heartbeats older than this belong to killed jobs."""
+    seconds = settings.ANALYSIS_STALE_INTERVALS * settings.ANALYSIS_PROGRESS_INTERVAL
+    return timezone.now() - timedelta(seconds=seconds)
+
+
+def is_stale(car):
+    """Whether a car's job is 'running' but its process stopped writing state."""
+    if car.analysis_state != Car.RUNNING:
+        return False
+    return car.analysis_heartbeat_at is None or car.analysis_heartbeat_at < stale_cutoff()
+
+
+def fail_stale_jobs(car_id=None):
+    """Mark stale running jobs (all, or the car's) as failed. Returns how many."""
+    jobs = Car.objects.filter(
+        Q(analysis_heartbeat_at__lt=stale_cutoff()) | Q(analysis_heartbeat_at__isnull=True),
+        analysis_state=Car.RUNNING,
+    )
+    if car_id is not None:
+        jobs = jobs.filter(id=car_id)
+    return jobs.update(
+        analysis_state=Car.FAILED,
+        analysis_error=STALE_ERROR,
+        analysis_finished_at=timezone.now(),
+    )
+
+
+class AnalysisJob:
+    """Writes the job state of one car's analysis (single-row updates)."""
+
+    def __init__(self, car_id, interval=None):
+        self.car_id = car_id
+        self.interval = settings.ANALYSIS_PROGRESS_INTERVAL if interval is None else interval
+        self.stage = None
+        self.percent = 0
+        self.last_write = 0.0
+
+    def update(self, **fields):
+        Car.objects.filter(id=self.car_id).update(analysis_heartbeat_at=timezone.now(), **fields)
+        self.last_write = time.monotonic()
+
+    def start(self):
+        self.stage, self.percent = None, 0
+        self.update(
+            analysis_state=Car.RUNNING,
+            analysis_progress=0,
+            analysis_stage='',
+            analysis_error='',
+            analysis_started_at=timezone.now(),
+            analysis_finished_at=None,
+        )
+
+    def enter(self, stage):
+        """Start a stage (written immediately)."""
+        self.stage = stage
+        self.percent = max(self.percent, STAGES[stage])
+        self.update(analysis_stage=stage, analysis_progress=self.percent)
+
+    def progress(self, fraction):
+        """
+        Report progress within the current stage (0-1). Written at most once
+        per interval: the percentage when it moved, otherwise only the
+        heartbeat.
+        """
+        if time.monotonic() - self.last_write < self.interval:
+            return
+        stages = list(STAGES)
+        start = STAGES[self.stage]
+        following = stages.index(self.stage) + 1
+        end = STAGES[stages[following]] if following < len(stages) else 99
+        percent = int(start + (end - start) * min(max(fraction, 0.0), 1.0))
+        if percent > self.percent:
+            self.percent = percent
+            self.update(analysis_progress=percent)
+        else:
+            self.update()
+
+    def fail(self, error):
+        self.update(
+            analysis_state=Car.FAILED,
+            analysis_error=str(error),
+            analysis_finished_at=timezone.now(),
+        )
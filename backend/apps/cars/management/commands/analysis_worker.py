@@ -0,0 +1,103 @@
+"""
+Long-lived analysis worker.
+Loads YOLO + OCR models once, then keeps pulling uploaded videos that are
+waiting for analysis (cars with a video in the 'queued' state). Each car is
+claimed atomically, so several workers can share the queue, and database
+errors are retried with a backoff instead of stopping the worker.
+
+Usage: python manage.py analysis_worker
+       python manage.py analysis_worker --poll-interval 5
+"""
+import time
+import traceback
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from apps.cars.jobs import fail_stale_jobs
+from apps.cars.management.commands.analyze_video import Command as AnalyzeVideoCommand
+from apps.cars.models import Car
+
+# Longest wait between retries after consecutive loop errors (seconds)
+MAX_BACKOFF = 60
+
+
+class Command(AnalyzeVideoCommand):
+    help = 'Run a persistent worker that keeps models loaded and analyzes queued videos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.ANALYSIS_WORKER_POLL_INTERVAL,
+            help='Seconds to wait between queue checks when idle',
+        )
+
+    def handle(self, *args, **options):
+        poll_interval = options['poll_interval']
+        self.load_models()
+        self.stdout.write(self.style.SUCCESS(f'✅ Analysis worker ready (polling every {poll_interval}s)'))
+
+        errors = 0
+        try:
+            while True:
+                # Drop connections the database closed while the worker was idle or busy
+                close_old_connections()
+                try:
+                    self.fail_stale_jobs()
+                    car = self.next_car()
+                    if car is not None:
+                        self.run_job(car)
+                    errors = 0
+                except Exception as e:
+                    # Database gone or restarting: keep the worker alive and retry
+                    errors += 1
+                    backoff = min(MAX_BACKOFF, poll_interval * 2 ** errors)
+                    self.stderr.write(self.style.ERROR(f'Worker loop error, retrying in {backoff:.0f}s: {e}'))
+                    self.stderr.write(traceback.format_exc())
+                    time.sleep(backoff)
+                    continue
+                if car is None:
+                    time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            self.stdout.write('Analysis worker stopped')
+        finally:
+            self.analyzer.close()
+
+    def fail_stale_jobs(self):
+        """
+        Jobs left 'running' by a killed worker or analyze_video run: mark them
+        failed instead of retrying them. Jobs of live workers keep their
+        heartbeat and are left alone, so several workers can run.
+        """
+        count = fail_stale_jobs()
+        if count:
+            self.stdout.write(self.style.WARNING(f'{count} interrupted analysis job(s) marked as failed'))
+
+    def next_car(self):
+        """
+        Claim the oldest queued car with a video, or None when there is none.
+        The claim is a conditional update, so when several workers race for
+        a car exactly one of them gets it.
+        """
+        queued = (
+            Car.objects.filter(analysis_state=Car.QUEUED, video__isnull=False)
+            .exclude(video='')
+            .order_by('created_at')
+        )
+        while True:
+            car = queued.first()
+            if car is None:
+                return None
+            claimed = Car.objects.filter(id=car.id, analysis_state=Car.QUEUED).update(
+                analysis_state=Car.RUNNING,
+                analysis_heartbeat_at=timezone.now(),
+            )
+            if claimed:
+                return car
+
+    def run_job(self, car):
+        # The analyzer records the failed state, so the car is not picked up again
+        try:
+            self.analyze_car(car)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Analysis failed for car {car.id}: {e}'))
@@ -0,0 +1,154 @@
+"""
+Benchmark the ONNX Runtime backend against the PyTorch / Paddle baseline.
+
+Reports per-model latency and agreement with the baseline:
+- vehicle / plate detectors: matched boxes (same class, IoU >= 0.5) as F1
+- OCR recognizer: identical plate texts
+
+Usage: python manage.py benchmark_inference
+       python manage.py benchmark_inference --models vehicle plate --quantization none dynamic static
+       python manage.py benchmark_inference --images 20 --repeat 3
+"""
+import glob
+import os
+import time
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.cars import analyzer
+from apps.cars.inference import ONNX, TORCH, calibration_frames, load_yolo, paddle_ocr_options
+from utils.vehicle_tracker import iou_matrix
+
+
+class Command(BaseCommand):
+    help = 'Compare ONNX Runtime (FP32 / INT8) inference with the PyTorch baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='*', default=['vehicle', 'plate', 'ocr'],
+                            choices=['vehicle', 'plate', 'ocr'], help='Models to benchmark')
+        parser.add_argument('--quantization', nargs='*', default=['none', 'dynamic', 'static'],
+                            choices=['none', 'dynamic', 'static'], help='ONNX variants to compare')
+        parser.add_argument('--images', type=int, default=32, help='Sample images per model')
+        parser.add_argument('--repeat', type=int, default=1, help='Runs per image, best time is reported')
+
+    def handle(self, *args, **options):
+        quantizations = ['' if q == 'none' else q for q in options['quantization']]
+        count, repeat = max(1, options['images']), max(1, options['repeat'])
+
+        frames = lambda: calibration_frames(analyzer.VIDEO_DIR, os.path.join(settings.ANALYSIS_ONNX_DIR, 'calibration'))
+        car_crops = lambda: sorted(glob.glob(os.path.join(analyzer.CAR_CROPS_DIR, '*.jpg')))
+        plate_crops = sorted(glob.glob(os.path.join(analyzer.PLATE_CROPS_DIR, '*.jpg')))
+
+        if 'vehicle' in options['models']:
+            self.benchmark_detector('vehicle', analyzer.VEHICLE_MODEL_PATH, frames, quantizations, count, repeat)
+        if 'plate' in options['models']:
+            self.benchmark_detector('plate', analyzer.LICENSE_MODEL_PATH, car_crops, quantizations, count, repeat)
+        if 'ocr' in options['models']:
+            self.benchmark_ocr(plate_crops[:count], quantizations, repeat)
+
+    def benchmark_detector(self, name, weights_path, sample_images, quantizations, count, repeat):
+        images = [img for img in (cv2.imread(p) for p in sample_images()[:count]) if img is not None]
+        if not images:
+            self.stdout.write(self.style.ERROR(f'{name}: no sample images'))
+            return
+
+        self.stdout.write(f'\n{name} detector ({os.path.basename(weights_path)}), {len(images)} images')
+        baseline_model = load_yolo(weights_path, backend=TORCH)
+        baseline, baseline_time = self.detect(baseline_model, images, repeat)
+        self.report('torch', baseline_time, len(images))
+
+        for quantization in quantizations:
+            model = load_yolo(weights_path, backend=ONNX, quantization=quantization, calibration=sample_images)
+            detections, elapsed = self.detect(model, images, repeat)
+            self.report(f'onnx {quantization or "fp32"}', elapsed, len(images), baseline_time,
+                        f'agreement {self.box_agreement(baseline, detections):.1%}')
+
+    def detect(self, model, images, repeat):
+        """Run a detector image by image. Returns (boxes per image, total seconds)."""
+        detections, total = [], 0.0
+        for image in images:
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = model(image, conf=0.25, verbose=False)[0]
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            total += best
+            detections.append([
+                (int(box.cls), list(map(float, box.xyxy[0].tolist()))) for box in result.boxes
+            ])
+        return detections, total
+
+    @staticmethod
+    def box_agreement(baseline, detections):
+        """F1 of boxes matched to the baseline (same class, IoU >= 0.5)."""
+        matched = total_base = total_other = 0
+        for base, other in zip(baseline, detections):
+            total_base += len(base)
+            total_other += len(other)
+            if not base or not other:
+                continue
+            ious = iou_matrix([b for _, b in base], [b for _, b in other])
+            for i, (cls, _) in enumerate(base):
+                for j, (other_cls, _) in enumerate(other):
+                    if other_cls != cls:
+                        ious[i, j] = 0
+            used = set()
+            for i in range(len(base)):
+                j = int(np.argmax(ious[i]))
+                if ious[i, j] >= 0.5 and j not in used:
+                    used.add(j)
+                    matched += 1
+        if total_base + total_other == 0:
+            return 1.0
+        return 2 * matched / (total_base + total_other)
+
+    def benchmark_ocr(self, plate_paths, quantizations, repeat):
+        images = [img for img in (cv2.imread(p) for p in plate_paths) if img is not None]
+        if not images:
+            self.stdout.write(self.style.ERROR('ocr: no plate crops'))
+            return
+
+        try:
+            from paddleocr import PaddleOCR
+        except ImportError as e:
+            self.stdout.write(self.style.ERROR(f'ocr: PaddleOCR not available ({e})'))
+            return
+
+        self.stdout.write(f'\nOCR recognizer, {len(images)} plates')
+        paddle_options = dict(use_angle_cls=False, lang='ar', show_log=False, use_gpu=False)
+        baseline_ocr = PaddleOCR(**paddle_options)
+        baseline, baseline_time = self.recognize(baseline_ocr, images, repeat)
+        self.report('paddle', baseline_time, len(images))
+
+        for quantization in quantizations:
+            if quantization == 'static':
+                continue  # OCR models only support dynamic INT8
+            ocr = PaddleOCR(**paddle_options, **paddle_ocr_options(baseline_ocr, quantization))
+            texts, elapsed = self.recognize(ocr, images, repeat)
+            same = sum(1 for a, b in zip(baseline, texts) if a == b)
+            self.report(f'onnx {quantization or "fp32"}', elapsed, len(images), baseline_time,
+                        f'same text {same}/{len(images)}')
+
+    def recognize(self, ocr, images, repeat):
+        """Recognition only, plate by plate. Returns (texts, total seconds)."""
+        texts, total = [], 0.0
+        for image in images:
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = ocr.ocr(image, det=False, cls=False)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            total += best
+            texts.append(result[0][0][0] if result and result[0] else '')
+        return texts, total
+
+    def report(self, label, elapsed, count, baseline_time=None, extra=''):
+        line = f'  {label:<14} {elapsed / count * 1000:8.1f} ms/image'
+        if baseline_time:
+            line += f'  {baseline_time / elapsed if elapsed else 0:5.2f}x'
+        if extra:
+            line += f'  {extra}'
+        self.stdout.write(line)
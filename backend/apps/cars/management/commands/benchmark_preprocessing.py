@@ -0,0 +1,90 @@
+"""
+Benchmark the plate preprocessing profiles ('fast' vs 'accurate').
+
+Reports, per profile, the preprocessing time per plate, how many pixels of
+the binarized plate match the 'accurate' profile and, when an OCR engine is
+installed, the OCR time per plate and how many plates read the same text as
+with the 'accurate' profile.
+
+Usage: python manage.py benchmark_preprocessing
+       python manage.py benchmark_preprocessing --repeat 3 --no-ocr
+       python manage.py benchmark_preprocessing --plates /path/a.jpg /path/b.jpg
+"""
+import glob
+import os
+import time
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.cars.plate_reader import PREPROCESS_PROFILES, PlateReader
+
+
+class Command(BaseCommand):
+    help = 'Compare the fast and accurate plate preprocessing profiles on plate_crops/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plates', nargs='*', help='Plate images (default: plate_crops/*.jpg)')
+        parser.add_argument('--repeat', type=int, default=1, help='Runs per profile, best time is reported')
+        parser.add_argument('--no-ocr', action='store_true', help='Only time preprocessing')
+
+    def handle(self, *args, **options):
+        paths = options['plates'] or sorted(glob.glob(os.path.join(settings.BASE_DIR, 'plate_crops', '*.jpg')))
+        plates = [img for img in (cv2.imread(p) for p in paths) if img is not None and img.size > 0]
+        if not plates:
+            self.stdout.write(self.style.ERROR('No plate images found'))
+            return
+
+        repeat = max(1, options['repeat'])
+        self.stdout.write(f'{len(plates)} plates')
+
+        # 'accurate' first: it is the reference for the agreement columns
+        profiles = sorted(PREPROCESS_PROFILES, key=lambda p: p != 'accurate')
+        binaries, texts = {}, {}
+        for profile in profiles:
+            elapsed, binaries[profile] = self.time_preprocessing(plates, profile, repeat)
+            line = f'  {profile:<9} preprocess {elapsed / len(plates) * 1000:7.1f} ms/plate'
+            line += f'  pixels same as accurate {self.pixel_agreement(binaries["accurate"], binaries[profile]):6.1%}'
+
+            if not options['no_ocr']:
+                ocr = self.time_ocr(plates, profile)
+                if ocr is not None:
+                    ocr_elapsed, texts[profile] = ocr
+                    same = sum(1 for a, b in zip(texts['accurate'], texts[profile]) if a == b)
+                    line += f'  OCR {ocr_elapsed / len(plates) * 1000:7.1f} ms/plate'
+                    line += f'  same text as accurate {same}/{len(plates)}'
+            self.stdout.write(line)
+
+        if not options['no_ocr'] and not texts:
+            self.stdout.write(self.style.WARNING('No OCR engine installed, OCR agreement skipped'))
+
+    def time_preprocessing(self, plates, profile, repeat):
+        """Best time of resize + binarization over all plates. Returns (seconds, binarized plates)."""
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            binaries = [PlateReader.preprocess_plate(plate, profile)[1] for plate in plates]
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, binaries
+
+    @staticmethod
+    def pixel_agreement(reference, binaries):
+        """Mean fraction of pixels equal to the reference binarization."""
+        return float(np.mean([np.mean(a == b) for a, b in zip(reference, binaries)]))
+
+    def time_ocr(self, plates, profile):
+        """
+        Read all plates with the OCR cascade (no cache) using a profile.
+        Returns (seconds, texts), or None without an OCR engine.
+        """
+        reader = PlateReader(profile=profile)
+        reader.load()
+        reader.cache = None
+        if reader.paddle_ocr is None and reader.easyocr_reader is None:
+            return None
+
+        start = time.perf_counter()
+        readings = reader.read_many(plates)
+        elapsed = time.perf_counter() - start
+        return elapsed, [reading['text'] if reading else None for reading in readings]
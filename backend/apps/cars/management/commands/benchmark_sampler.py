@@ -0,0 +1,69 @@
+"""
+Benchmark frame sampling strategies (seek vs sequential decode).
+
+Usage: python manage.py benchmark_sampler
+       python manage.py benchmark_sampler --stride 10 --repeat 3
+       python manage.py benchmark_sampler --videos /path/a.mp4 /path/b.mp4
+"""
+import glob
+import os
+import time
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from utils.frame_sampler import FrameSampler, probe_gop_size
+
+
+class Command(BaseCommand):
+    help = 'Compare seek and sequential frame sampling on the sample videos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--videos', nargs='*', help='Video files (default: videos/*)')
+        parser.add_argument('--stride', type=int, default=0, help='Sampling stride in frames (default: FPS)')
+        parser.add_argument('--repeat', type=int, default=1, help='Runs per strategy, best time is reported')
+
+    def handle(self, *args, **options):
+        videos = options['videos'] or sorted(glob.glob(os.path.join(settings.BASE_DIR, 'videos', '*')))
+        if not videos:
+            self.stdout.write(self.style.ERROR('No videos found'))
+            return
+
+        for video_path in videos:
+            self.benchmark_video(video_path, options['stride'], max(1, options['repeat']))
+
+    def benchmark_video(self, video_path, stride, repeat):
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            self.stdout.write(self.style.ERROR(f'Failed to open {video_path}'))
+            return
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+        stride = stride or max(1, int(fps))
+        gop_size = probe_gop_size(video_path)
+        self.stdout.write(f'\n{os.path.basename(video_path)}: {frame_count} frames, {fps:.1f} FPS, '
+                          f'stride={stride}, GOP={gop_size or "unknown"}, '
+                          f'auto -> {FrameSampler(None, stride, frame_count, gop_size=gop_size).mode}')
+
+        timings = {}
+        checksums = {}
+        for mode in (FrameSampler.SEEK, FrameSampler.SEQUENTIAL):
+            best = None
+            for _ in range(repeat):
+                cap = cv2.VideoCapture(video_path)
+                start = time.perf_counter()
+                sampled = [(idx, int(np.sum(frame, dtype=np.uint64)))
+                           for idx, frame in FrameSampler(cap, stride, frame_count, mode=mode)]
+                elapsed = time.perf_counter() - start
+                cap.release()
+                best = elapsed if best is None else min(best, elapsed)
+            timings[mode] = best
+            checksums[mode] = sampled
+            self.stdout.write(f'  {mode:<10} {len(sampled):>5} frames  {best:8.3f}s  '
+                              f'{len(sampled) / best if best else 0:8.1f} frames/s')
+
+        speedup = timings[FrameSampler.SEEK] / timings[FrameSampler.SEQUENTIAL] if timings[FrameSampler.SEQUENTIAL] else 0
+        identical = checksums[FrameSampler.SEEK] == checksums[FrameSampler.SEQUENTIAL]
+        self.stdout.write(f'  sequential speedup: {speedup:.2f}x, identical frames: {"yes" if identical else "NO"}')
@@ -0,0 +1,138 @@
+"""
+Enhance the stored crops of all detected vehicles in parallel processes.
+
+Enhanced copies are written next to the originals (car_1_v0_enhanced.jpg,
+car_1_v0_enhanced_otsu_morph.jpg), originals are never overwritten. Every
+processed image is recorded with the SHA-256 of its content in a manifest
+(JSON lines), so a rerun, or a run resumed after an interruption, skips
+images whose content was already enhanced with the same method.
+
+Usage: python manage.py enhance_images
+       python manage.py enhance_images --kinds plate --workers 4
+       python manage.py enhance_images --method advanced --variant otsu_morph
+"""
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from apps.cars.bulk_enhance import _enhance_file, _init_worker, is_derived, method_key
+from apps.vehicles.models import DetectedVehicle
+from utils.cpu_quota import available_cpus
+from utils.image_enhancement import ADVANCED_VARIANTS
+
+# Image kind -> (DetectedVehicle field, directory)
+KINDS = {
+    'crop': ('crop_image', 'car_crops'),
+    'plate': ('plate_image', 'plate_crops'),
+    'face': ('driver_face_image', 'face_crops'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Enhance all stored vehicle, plate and face crops (resumable, skips processed content)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kinds', nargs='*', default=list(KINDS), choices=list(KINDS), help='Images to enhance')
+        parser.add_argument('--method', default='basic', choices=['basic', 'advanced'], help='Enhancement method')
+        parser.add_argument('--variant', default='enhanced', choices=list(ADVANCED_VARIANTS),
+                            help='Variant for --method advanced')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: available CPUs)')
+        parser.add_argument('--manifest', default=str(settings.BASE_DIR / 'enhanced_manifest.jsonl'),
+                            help='Manifest of processed image hashes')
+        parser.add_argument('--progress', type=int, default=500, help='Report progress every N images')
+
+    def handle(self, *args, **options):
+        key = method_key(options['method'], options['variant'])
+        workers = max(1, options['workers'] or available_cpus())
+        manifest = options['manifest']
+
+        sources, missing = self.collect_sources(options['kinds'])
+        done = self.load_manifest(manifest, key)
+        self.stdout.write(
+            f'{len(sources)} images ({missing} missing), {len(done)} already enhanced ({key}), '
+            f'{workers} workers'
+        )
+        if not sources:
+            return
+
+        counts = {'done': 0, 'skipped': 0, 'failed': 0}
+        start = time.perf_counter()
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(done, options['method'], options['variant']),
+        )
+        try:
+            with open(manifest, 'a') as log:
+                chunksize = max(1, min(16, len(sources) // (workers * 4)))
+                for n, (status, source, output, digest, _) in enumerate(
+                    executor.map(_enhance_file, sources, chunksize=chunksize), 1
+                ):
+                    counts[status] += 1
+                    if status == 'done':
+                        # One line per image, flushed: an interrupted run resumes from here
+                        log.write(json.dumps({'sha256': digest, 'method': key, 'source': source, 'output': output}) + '\n')
+                        log.flush()
+                    elif status == 'failed':
+                        self.stdout.write(self.style.WARNING(f'  {source}: {output}'))
+                    if n % options['progress'] == 0:
+                        self.report(counts, n, len(sources), time.perf_counter() - start)
+        except KeyboardInterrupt:
+            # Images already written but not in the manifest are redone on the next run
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.stdout.write(self.style.WARNING('Interrupted, rerun to resume'))
+            return
+        executor.shutdown(wait=True)
+
+        elapsed = time.perf_counter() - start
+        self.report(counts, sum(counts.values()), len(sources), elapsed)
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {counts["done"]} enhanced, {counts["skipped"]} skipped, {counts["failed"]} failed '
+            f'in {elapsed:.1f}s'
+        ))
+
+    def collect_sources(self, kinds):
+        """Existing image files of all DetectedVehicle rows. Returns (paths, missing count)."""
+        fields = [KINDS[kind][0] for kind in kinds]
+        sources, missing = {}, 0
+        for row in DetectedVehicle.objects.values_list(*fields).iterator(chunk_size=2000):
+            for kind, filename in zip(kinds, row):
+                if not filename or is_derived(filename):
+                    continue
+                path = os.path.join(settings.BASE_DIR, KINDS[kind][1], os.path.basename(filename))
+                if path in sources:
+                    continue
+                if os.path.exists(path):
+                    sources[path] = True
+                else:
+                    missing += 1
+        return sorted(sources), missing
+
+    def load_manifest(self, path, key):
+        """Content hashes already enhanced with method `key`."""
+        done = set()
+        if not os.path.exists(path):
+            return done
+        try:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # line cut off by an interruption
+                    if entry.get('method') == key:
+                        done.add(entry['sha256'])
+        except OSError as e:
+            raise CommandError(f'Cannot read manifest {path}: {e}')
+        return done
+
+    def report(self, counts, n, total, elapsed):
+        rate = n / elapsed if elapsed > 0 else 0
+        self.stdout.write(
+            f'  {n}/{total} images, {counts["done"]} enhanced, {counts["skipped"]} skipped, '
+            f'{counts["failed"]} failed, {rate:.1f} images/s'
+        )
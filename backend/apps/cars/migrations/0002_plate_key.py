@@ -0,0 +1,44 @@
+"""
+Normalized plate keys for Car and DetectedVehicle.
+
+DetectedVehicle's table is created by 0001_initial of this app, so its
+plate_key column is added here as well.
+"""
+from django.db import migrations, models
+from utils.plate_normalizer import normalize_plate
+
+
+def fill_plate_keys(apps, schema_editor):
+    Car = apps.get_model('cars', 'Car')
+    DetectedVehicle = apps.get_model('cars', 'DetectedVehicle')
+
+    cars = list(Car.objects.only('id', 'plate'))
+    for car in cars:
+        car.plate_key = normalize_plate(car.plate)
+    Car.objects.bulk_update(cars, ['plate_key'], batch_size=500)
+
+    vehicles = list(DetectedVehicle.objects.exclude(plate_text__isnull=True).only('id', 'plate_text'))
+    for vehicle in vehicles:
+        vehicle.plate_key = normalize_plate(vehicle.plate_text)
+    DetectedVehicle.objects.bulk_update(vehicles, ['plate_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='plate_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='detectedvehicle',
+            name='plate_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=50),
+        ),
+        migrations.RunPython(fill_plate_keys, migrations.RunPython.noop),
+    ]
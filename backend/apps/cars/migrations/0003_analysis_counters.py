@@ -0,0 +1,71 @@
+"""
+Analysis counters on Car (vehicle_count, plates_detected, faces_detected,
+analyzed_at), filled from the existing DetectedVehicle rows.
+"""
+import json
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_counters(apps, schema_editor):
+    Car = apps.get_model('cars', 'Car')
+    DetectedVehicle = apps.get_model('cars', 'DetectedVehicle')
+
+    counts = {
+        row['video_id']: row
+        for row in DetectedVehicle.objects.order_by().values('video_id').annotate(
+            vehicles=Count('id'),
+            plates=Count('id', filter=Q(plate_image__isnull=False) & ~Q(plate_image='')),
+            faces=Count('id', filter=Q(driver_face_image__isnull=False) & ~Q(driver_face_image='')),
+        )
+    }
+
+    cars = list(Car.objects.exclude(analysis__isnull=True).only('id', 'analysis', 'updated_at'))
+    for car in cars:
+        summary = car.analysis
+        if isinstance(summary, str):
+            try:
+                summary = json.loads(summary)
+            except ValueError:
+                summary = None
+        if not isinstance(summary, dict) or 'error' in summary:
+            continue  # failed analysis
+        row = counts.get(car.id, {})
+        car.vehicle_count = row.get('vehicles', 0)
+        car.plates_detected = row.get('plates', 0)
+        car.faces_detected = row.get('faces', 0)
+        car.analyzed_at = car.updated_at
+    Car.objects.bulk_update(
+        cars, ['vehicle_count', 'plates_detected', 'faces_detected', 'analyzed_at'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0002_plate_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='vehicle_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='plates_detected',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='faces_detected',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='analyzed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
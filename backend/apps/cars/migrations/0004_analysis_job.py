@@ -0,0 +1,73 @@
+"""
+Analysis job state on Car (state, progress, stage, error, start/end times).
+Existing cars are done, failed (an error summary) or still queued.
+"""
+import json
+from django.db import migrations, models
+
+
+def fill_states(apps, schema_editor):
+    Car = apps.get_model('cars', 'Car')
+
+    cars = list(Car.objects.exclude(analysis__isnull=True).only('id', 'analysis', 'analyzed_at', 'updated_at'))
+    for car in cars:
+        summary = car.analysis
+        if isinstance(summary, str):
+            try:
+                summary = json.loads(summary)
+            except ValueError:
+                summary = None
+        if isinstance(summary, dict) and 'error' in summary:
+            car.analysis_state = 'failed'
+            car.analysis_error = str(summary['error'])
+        else:
+            car.analysis_state = 'done'
+            car.analysis_progress = 100
+        car.analysis_finished_at = car.analyzed_at or car.updated_at
+    Car.objects.bulk_update(
+        cars, ['analysis_state', 'analysis_progress', 'analysis_error', 'analysis_finished_at'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0003_analysis_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='analysis_state',
+            field=models.CharField(
+                choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')],
+                db_index=True, default='queued', max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='analysis_progress',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='analysis_stage',
+            field=models.CharField(blank=True, default='', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='analysis_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='analysis_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='analysis_finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_states, migrations.RunPython.noop),
+    ]
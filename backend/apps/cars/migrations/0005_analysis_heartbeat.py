@@ -0,0 +1,26 @@
+"""
+Heartbeat of the analysis job (last job state write), to tell running jobs
+from killed ones. Jobs already running count from their start.
+"""
+from django.db import migrations, models
+
+
+def fill_heartbeats(apps, schema_editor):
+    Car = apps.get_model('cars', 'Car')
+    Car.objects.filter(analysis_state='running').update(analysis_heartbeat_at=models.F('analysis_started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0004_analysis_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='analysis_heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_heartbeats, migrations.RunPython.noop),
+    ]
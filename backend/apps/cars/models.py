@@ -2,15 +2,44 @@
 Cars app models for Gas Station Monitoring system.
 """
 from django.db import models
+from utils.plate_normalizer import normalize_plate
 
 
 class Car(models.Model):
     """Car model to store car information and payment status."""
+
+    # Analysis job states
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    ANALYSIS_STATES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
     
     plate = models.CharField(max_length=20, unique=True, db_index=True)
+    # normalize_plate(plate): plate lookups match on this key
+    plate_key = models.CharField(max_length=50, blank=True, default='', db_index=True, editable=False)
     paid = models.BooleanField(default=False, db_index=True)
     video = models.CharField(max_length=255, null=True, blank=True)
     analysis = models.JSONField(null=True, blank=True)
+    # Counters of the last analysis, written with its DetectedVehicle rows
+    vehicle_count = models.PositiveIntegerField(default=0)
+    plates_detected = models.PositiveIntegerField(default=0)
+    faces_detected = models.PositiveIntegerField(default=0)
+    analyzed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Analysis job: state, percent complete and current stage, updated while it runs
+    analysis_state = models.CharField(max_length=10, choices=ANALYSIS_STATES, default=QUEUED, db_index=True)
+    analysis_progress = models.PositiveSmallIntegerField(default=0)
+    analysis_stage = models.CharField(max_length=30, blank=True, default='')
+    analysis_error = models.TextField(blank=True, default='')
+    analysis_started_at = models.DateTimeField(null=True, blank=True)
+    analysis_finished_at = models.DateTimeField(null=True, blank=True)
+    # Last job state write: a running job without one for long was killed
+    analysis_heartbeat_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -20,3 +49,10 @@ class Car(models.Model):
 
     def __str__(self):
         return f"Car {self.id} - Plate: {self.plate} - Paid: {self.paid}"
+
+    def save(self, *args, **kwargs):
+        self.plate_key = normalize_plate(self.plate)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'plate' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'plate_key'}
+        super().save(*args, **kwargs)
@@ -0,0 +1,82 @@
+"""
+Pipelined plate OCR.
+
+Plate crops are read in a small process pool while the analyzer keeps
+detecting vehicles: each worker process loads its own PaddleOCR / EasyOCR
+once and reads the plates of the vehicle tracks it is given. Results are
+gathered before the analysis is written to the database.
+
+This module only imports the standard library at the top: worker processes
+are spawned fresh and must set up Django before importing the plate reader.
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Per-process plate reader, created by _init_worker
+_reader = None
+
+
+def _init_worker(threads):
+    """Limit CPU threads, set up Django and load the OCR models in a worker process."""
+    global _reader
+
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['OPENBLAS_NUM_THREADS'] = str(threads)
+
+    import django
+    django.setup()
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    from apps.cars.plate_reader import PlateReader
+    _reader = PlateReader()
+    _reader.load()
+
+
+def _read_vehicles(crop_lists, deadline):
+    """Read the plates of a group of vehicles (see PlateReader.read_vehicles)."""
+    return _reader.read_vehicles(crop_lists, deadline=deadline)
+
+
+class OCRPool:
+    """Process pool that reads plates with per-process OCR models."""
+
+    def __init__(self, workers, threads):
+        """
+        Args:
+            workers: Number of worker processes
+            threads: CPU threads per worker
+        """
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(threads,),
+        )
+        logger.info(f'[ANALYZE] OCR pool started: {workers} workers x {threads} threads')
+
+    def submit(self, crop_lists, deadline=None):
+        """
+        Queue the plates of a group of vehicles.
+
+        Args:
+            crop_lists: Per vehicle, plate crops ordered best first
+            deadline: time.time() after which no extra reads start (default:
+                the video budget counted from when the group is read)
+
+        Returns:
+            Future of (fused reading or None per vehicle, stats)
+        """
+        return self.executor.submit(_read_vehicles, crop_lists, deadline)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,105 @@
+"""
+Segment-parallel video scanning.
+
+Long videos are split into keyframe-aligned segments that are scanned in a
+process pool. Each worker process loads its own YOLO models once and reuses
+them for every segment it is given, so the pool can stay alive across videos.
+
+This module only imports the standard library at the top: worker processes
+are spawned fresh and must set up Django before importing the analyzer.
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# Per-process analyzer, created by _init_worker
+_analyzer = None
+
+# Seconds between on_done calls while a segment is still being scanned
+WAIT_INTERVAL = 1.0
+
+
+def _init_worker(threads, batch_size):
+    """Limit CPU threads, set up Django and load the models in a worker process."""
+    global _analyzer
+
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['OPENBLAS_NUM_THREADS'] = str(threads)
+
+    import django
+    django.setup()
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    from apps.cars.analyzer import VideoAnalyzer
+    _analyzer = VideoAnalyzer(batch_size=batch_size, workers=1, load_ocr=False)
+
+
+def _scan_segment(video_path, start_frame, end_frame):
+    """Scan one [start_frame, end_frame) segment and return its tracks, track spans and sampling counters."""
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f'Failed to open video: {video_path}')
+    try:
+        tracks, spans, sampling = _analyzer.scan_video(cap, video_path, start_frame=start_frame, end_frame=end_frame)
+    finally:
+        cap.release()
+    return list(tracks.items()), spans, sampling
+
+
+class SegmentPool:
+    """Process pool that scans video segments with per-process models."""
+
+    def __init__(self, workers, batch_size, threads):
+        """
+        Args:
+            workers: Number of worker processes
+            batch_size: Vehicle-detector batch size in each worker
+            threads: CPU threads per worker (split the CPU quota between workers)
+        """
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(threads, batch_size),
+        )
+        logger.info(f'[ANALYZE] Segment pool started: {workers} workers x {threads} threads')
+
+    def scan(self, video_path, segments, on_done=None):
+        """
+        Scan segments in parallel.
+
+        Args:
+            video_path: Path to the video file
+            segments: List of (start_frame, end_frame)
+            on_done: Called with the number of segments collected so far,
+                also every WAIT_INTERVAL seconds while waiting for the next one
+
+        Returns:
+            One (tracks, spans, sampling) per segment, in segment order
+        """
+        futures = [
+            self.executor.submit(_scan_segment, video_path, start, end)
+            for start, end in segments
+        ]
+        results = []
+        for future in futures:
+            while on_done is not None and not wait([future], timeout=WAIT_INTERVAL).done:
+                on_done(len(results))
+            results.append(future.result())
+            if on_done is not None:
+                on_done(len(results))
+        return results
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
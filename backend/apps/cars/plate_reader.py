@@ -0,0 +1,492 @@
+"""
+License plate reader for the Gas Station Monitoring system.
+
+Runs OCR passes over plate crops as a confidence-gated cascade: passes run
+in the configured order (cheapest/most accurate first) and a plate leaves
+the cascade at its first result that is confident enough and looks like a
+KSA plate. Only when no pass qualifies is the best of all results used.
+All plates of a video are read together so PaddleOCR recognition runs in
+batches.
+"""
+import re
+import time
+import logging
+import cv2
+import numpy as np
+from django.conf import settings
+from apps.cars.inference import ONNX, paddle_ocr_options
+from utils.ocr_cache import OCRCache, content_hash
+
+logger = logging.getLogger(__name__)
+
+# 3 Arabic letters (not Arabic-Indic digits) followed by 1-4 digits, as
+# produced by clean_ksa_plate
+_LETTER = r'[\u0600-\u065F\u066A-\u06EF\u06FA-\u06FF]'
+KSA_PLATE_RE = re.compile(rf'^{_LETTER}( {_LETTER}){{2}} [0-9]{{1,4}}$')
+
+# Plate preprocessing profiles. 'accurate' denoises the plate with non-local
+# means before binarization and lets paddle_detect run the angle classifier;
+# 'fast' uses a bilateral filter instead and skips the angle classifier
+# (plates are axis-aligned crops from best.pt).
+PREPROCESS_PROFILES = ('fast', 'accurate')
+
+# Pass name -> (engine, plate image variant)
+OCR_PASSES = {
+    'paddle_color': ('paddle', 'color'),
+    'paddle_binary': ('paddle', 'binary'),
+    'paddle_detect': ('paddle_detect', 'color'),
+    'easy_color': ('easy', 'color'),
+    'easy_binary': ('easy', 'binary'),
+}
+
+
+
+def ocr_deadline():
+    """
+    Deadline for the extra OCR rounds of one video: ANALYSIS_OCR_TIME_BUDGET
+    seconds from now. Wall-clock time, so the OCR pool processes of a video
+    can share it.
+    """
+    return time.time() + settings.ANALYSIS_OCR_TIME_BUDGET
+
+class PlateReader:
+    """
+    PaddleOCR (primary) + EasyOCR (fallback) plate reader.
+
+    Each pass is an OCR engine run on one preprocessed version of the plate:
+    - paddle_color / paddle_binary: PaddleOCR recognition only (no text
+      detection, the plate is already localized by best.pt) on the color /
+      binarized plate, batched over all plates of a video
+    - paddle_detect: full PaddleOCR (text detection + angle classifier +
+      recognition) on the color plate, for plates recognition could not read
+    - easy_color / easy_binary: EasyOCR on the color / binarized plate
+    """
+
+    def __init__(self, passes=None, accept_conf=None, pass_conf=None, batch_size=None, profile=None):
+        """
+        Args:
+            passes: Pass names in cascade order (default: ANALYSIS_OCR_PASSES)
+            accept_conf: Confidence that ends the cascade (default: ANALYSIS_OCR_ACCEPT_CONF)
+            pass_conf: Per-pass overrides of accept_conf (default: ANALYSIS_OCR_PASS_CONF)
+            batch_size: Plates per recognition batch (default: ANALYSIS_OCR_BATCH_SIZE)
+            profile: 'fast' or 'accurate' preprocessing (default: ANALYSIS_PLATE_PROFILE)
+        """
+        self.passes = [p for p in (passes or settings.ANALYSIS_OCR_PASSES) if p in OCR_PASSES]
+        self.accept_conf = accept_conf if accept_conf is not None else settings.ANALYSIS_OCR_ACCEPT_CONF
+        self.pass_conf = pass_conf if pass_conf is not None else settings.ANALYSIS_OCR_PASS_CONF
+        self.batch_size = max(1, batch_size or settings.ANALYSIS_OCR_BATCH_SIZE)
+        self.profile = profile or settings.ANALYSIS_PLATE_PROFILE
+        if self.profile not in PREPROCESS_PROFILES:
+            raise ValueError(f'Unknown plate preprocessing profile: {self.profile}')
+        self.angle_cls = self.profile == 'accurate'
+        self.paddle_ocr = None
+        self.easyocr_reader = None
+        self.cache = None
+
+    def load(self):
+        """Load PaddleOCR and EasyOCR, skipping the ones that are not installed."""
+        # Primary OCR: PaddleOCR (better Arabic accuracy for KSA plates)
+        try:
+            from paddleocr import PaddleOCR
+            paddle_options = dict(
+                use_angle_cls=self.angle_cls,
+                lang='ar',
+                show_log=False,
+                use_gpu=False,
+                rec_batch_num=self.batch_size,
+            )
+            self.paddle_ocr = PaddleOCR(**paddle_options)
+            logger.info('[ANALYZE] PaddleOCR loaded (primary OCR)')
+
+            if settings.ANALYSIS_INFERENCE_BACKEND == ONNX:
+                try:
+                    self.paddle_ocr = PaddleOCR(**paddle_options, **paddle_ocr_options(self.paddle_ocr))
+                    logger.info('[ANALYZE] PaddleOCR running on onnxruntime')
+                except Exception as e:
+                    logger.warning(f'[ANALYZE] PaddleOCR ONNX backend not available, using Paddle: {e}')
+        except Exception as e:
+            logger.warning(f'[ANALYZE] PaddleOCR not available: {e}')
+
+        # Fallback OCR: EasyOCR
+        try:
+            import easyocr
+            self.easyocr_reader = easyocr.Reader(['en', 'ar'], gpu=False)
+            logger.info('[ANALYZE] EasyOCR loaded (fallback OCR)')
+        except Exception as e:
+            logger.warning(f'[ANALYZE] EasyOCR not available: {e}')
+
+        # Readings of plates seen before (re-analysis, parked cars)
+        if settings.ANALYSIS_OCR_CACHE_PATH:
+            self.cache = OCRCache(
+                settings.ANALYSIS_OCR_CACHE_PATH,
+                max_entries=settings.ANALYSIS_OCR_CACHE_SIZE,
+            )
+
+    def threshold(self, pass_name):
+        """Confidence a result of `pass_name` needs to end the cascade."""
+        return self.pass_conf.get(pass_name, self.accept_conf)
+
+    def available(self, engine):
+        if engine in ('paddle', 'paddle_detect'):
+            return self.paddle_ocr is not None
+        return self.easyocr_reader is not None
+
+    def read(self, plate_image):
+        """
+        Read one plate with the OCR cascade.
+
+        Returns:
+            Dict with 'text', 'confidence', 'method' (winning pass), 'passes'
+            (number of passes run) and 'cached' (read from the OCR cache),
+            or None if nothing was read
+        """
+        return self.read_many([plate_image])[0]
+
+    def read_many(self, plate_images):
+        """
+        Read all plates of a video with the OCR cascade.
+
+        Plates whose crop is already cached (see utils.ocr_cache) are not
+        read again. Each pass runs once over every plate that is still
+        unresolved, so recognition-only PaddleOCR passes see the plates in
+        batches. A plate leaves the cascade at its first confident,
+        well-formed result.
+
+        Args:
+            plate_images: List of plate crops (None entries are skipped)
+
+        Returns:
+            One reading (see read) or None per plate, in input order
+        """
+        plates = []
+        for image in plate_images:
+            if image is None or image.size == 0:
+                plates.append(None)
+                continue
+            plate = {'key': None, 'cached': None, 'results': [], 'passes': 0, 'best': None}
+            if self.cache is not None:
+                plate['key'] = content_hash(image)
+                plate['cached'] = self.cache.get(plate['key'])
+            if plate['cached'] is None:
+                plate['images'] = {'color': self.resize_plate(image)}
+            plates.append(plate)
+
+        for pass_name in self.passes:
+            engine, variant = OCR_PASSES[pass_name]
+            pending = [p for p in plates if p is not None and p['cached'] is None and p['best'] is None]
+            if not pending or not self.available(engine):
+                continue
+
+            # The binarized plate (denoise + threshold) is only built when a pass needs it
+            for plate in pending:
+                if variant not in plate['images']:
+                    plate['images'][variant] = self.binarize_plate(plate['images']['color'], self.profile)
+
+            pass_results = self.run_pass(pass_name, [p['images'][variant] for p in pending])
+            for plate, results in zip(pending, pass_results):
+                plate['passes'] += 1
+                plate['results'].extend(results)
+                accepted = [
+                    r for r in results
+                    if r[1] >= self.threshold(pass_name) and self.is_ksa_plate(r[0])
+                ]
+                if accepted:
+                    plate['best'] = max(accepted, key=lambda x: x[1])
+
+        readings = [self.reading(plate) for plate in plates]
+
+        if self.cache is not None:
+            for plate, reading in zip(plates, readings):
+                if reading is not None and not reading['cached']:
+                    self.cache.put(plate['key'], {k: reading[k] for k in ('text', 'confidence', 'method')})
+            self.cache.save()
+
+        return readings
+
+    def read_vehicles(self, crop_lists, max_reads=None, deadline=None):
+        """
+        Read each vehicle's plate from several frames and fuse the reads.
+
+        Reads happen in rounds: round n reads the n-th best crop of every
+        vehicle whose reads don't agree yet (batched, see read_many). A
+        vehicle is settled once two reads give the same text, so extra
+        reads are only spent on ambiguous plates. Rounds after the first
+        stop at the deadline.
+
+        Args:
+            crop_lists: Per vehicle, plate crops ordered best first
+            max_reads: Maximum crops read per vehicle (default: ANALYSIS_OCR_MAX_READS)
+            deadline: time.time() after which no further round starts
+                (default: ocr_deadline(), the budget of a whole video)
+
+        Returns:
+            (fused reading or None per vehicle, stats dict with 'reads',
+            'cache_hits' and 'cache_misses')
+        """
+        max_reads = max(1, max_reads or settings.ANALYSIS_OCR_MAX_READS)
+        deadline = deadline if deadline is not None else ocr_deadline()
+        reads = [[] for _ in crop_lists]
+        stats = {'reads': 0, 'cache_hits': 0, 'cache_misses': 0}
+
+        for round_idx in range(max_reads):
+            if round_idx > 0 and time.time() > deadline:
+                logger.info(f'  [OCR] Time budget used up after {round_idx} round(s)')
+                break
+            todo = [
+                i for i, crops in enumerate(crop_lists)
+                if round_idx < len(crops) and not self.settled(reads[i])
+            ]
+            if not todo:
+                break
+
+            results = self.read_many([crop_lists[i][round_idx] for i in todo])
+            for i, reading in zip(todo, results):
+                reads[i].append(reading)
+                stats['reads'] += 1
+                if self.cache is not None:
+                    stats['cache_hits' if reading and reading['cached'] else 'cache_misses'] += 1
+
+        return [self.fuse(r) for r in reads], stats
+
+    @staticmethod
+    def settled(reads):
+        """Whether two of a vehicle's reads agree."""
+        texts = [r['text'] for r in reads if r]
+        return len(texts) != len(set(texts))
+
+    def fuse(self, reads):
+        """Combine a vehicle's reads into one reading by character voting."""
+        reads = [r for r in reads if r]
+        if not reads:
+            return None
+        if len(reads) == 1:
+            return dict(reads[0], reads=1)
+
+        text = self.vote_plate([(r['text'], r['confidence']) for r in reads])
+        agreeing = [r for r in reads if r['text'] == text]
+        if agreeing:
+            best = max(agreeing, key=lambda r: r['confidence'])
+            confidence, method = best['confidence'], best['method']
+        else:
+            # Characters taken from different reads
+            confidence, method = sum(r['confidence'] for r in reads) / len(reads), 'vote'
+
+        logger.info(f'  [OCR] Fused {len(reads)} reads {[r["text"] for r in reads]} -> "{text}"')
+        return {
+            'text': text,
+            'confidence': confidence,
+            'method': method,
+            'passes': sum(r['passes'] for r in reads),
+            'cached': all(r['cached'] for r in reads),
+            'reads': len(reads),
+        }
+
+    @staticmethod
+    def vote_plate(readings):
+        """
+        Position-wise character voting over cleaned plate texts.
+
+        Follows the KSA layout (letters + digits): the number of letters and
+        of digits is voted first, then each letter/digit position among the
+        reads with that layout. Votes are weighted by OCR confidence.
+
+        Args:
+            readings: List of (cleaned text, confidence)
+
+        Returns:
+            Voted text in clean_ksa_plate format
+        """
+        parsed = []
+        for text, conf in readings:
+            tokens = text.split()
+            letters = [t for t in tokens if not t.isdigit()]
+            digits = ''.join(t for t in tokens if t.isdigit())
+            parsed.append((letters, digits, conf))
+
+        def vote(options):
+            totals = {}
+            for option, weight in options:
+                totals[option] = totals.get(option, 0) + weight
+            return max(totals, key=totals.get)
+
+        letter_count = vote([(len(letters), conf) for letters, _, conf in parsed])
+        digit_count = vote([(len(digits), conf) for _, digits, conf in parsed])
+
+        letters = [
+            vote([(ls[pos], conf) for ls, _, conf in parsed if len(ls) == letter_count])
+            for pos in range(letter_count)
+        ]
+        digits = ''.join(
+            vote([(ds[pos], conf) for _, ds, conf in parsed if len(ds) == digit_count])
+            for pos in range(digit_count)
+        )
+        return ' '.join(letters + ([digits] if digits else []))
+
+    def reading(self, plate):
+        """Final reading of one plate after the cascade (or from the cache)."""
+        if plate is None:
+            return None
+        if plate['cached'] is not None:
+            logger.info(f'  [OCR] Cache hit: "{plate["cached"]["text"]}"')
+            return dict(plate['cached'], passes=0, cached=True)
+        if not plate['results']:
+            return None
+        best = plate['best']
+        if best is None:
+            # No pass was conclusive: prefer well-formed plates, then confidence
+            best = max(plate['results'], key=lambda x: (self.is_ksa_plate(x[0]), x[1]))
+        else:
+            logger.info(f'  [OCR] Early exit after {plate["passes"]} pass(es)')
+
+        logger.info(f'  [OCR] All: {[(r[0], f"{r[1]:.2f}", r[2]) for r in plate["results"]]}')
+        logger.info(f'  [OCR] Best: "{best[0]}" (conf={best[1]:.2f}, method={best[2]})')
+        return {'text': best[0], 'confidence': best[1], 'method': best[2], 'passes': plate['passes'], 'cached': False}
+
+    def run_pass(self, pass_name, images):
+        """
+        Run one OCR pass over plate images.
+
+        Returns:
+            One [(cleaned text, conf, pass name)] list per image
+        """
+        engine, _ = OCR_PASSES[pass_name]
+        if engine == 'paddle':
+            lines = self.recognize(images, pass_name)
+        else:
+            lines = [self.detect_and_recognize(engine, image, pass_name) for image in images]
+
+        results = []
+        for image_lines in lines:
+            cleaned = [(self.clean_ksa_plate(text), float(conf)) for text, conf in image_lines]
+            results.append([(text, conf, pass_name) for text, conf in cleaned if text])
+        return results
+
+    def recognize(self, images, pass_name):
+        """
+        PaddleOCR recognition only (no text detection, no angle classifier),
+        batched. Returns one [(text, conf)] list per image.
+
+        Calls the recognizer directly: PaddleOCR.ocr() treats a list as
+        separate images (one result list each) and recognizes them one by one.
+        """
+        images = [cv2.cvtColor(img, cv2.COLOR_GRAY2BGR) if img.ndim == 2 else img for img in images]
+        lines = []
+        for start in range(0, len(images), self.batch_size):
+            batch = images[start:start + self.batch_size]
+            try:
+                rec, _ = self.paddle_ocr.text_recognizer(batch)
+                if len(rec) != len(batch):
+                    raise ValueError(f'{len(rec)} results for {len(batch)} plates')
+                lines.extend([[(text, conf)] if text else [] for text, conf in rec])
+            except Exception as e:
+                logger.warning(f'  [OCR] {pass_name} error: {e}')
+                lines.extend([[] for _ in batch])
+        return lines
+
+    def detect_and_recognize(self, engine, image, pass_name):
+        """Full OCR (text detection + recognition) on one image. Returns [(text, conf)]."""
+        try:
+            if engine == 'paddle_detect':
+                paddle_res = self.paddle_ocr.ocr(image, cls=self.angle_cls)
+                return [line[1] for line in paddle_res[0]] if paddle_res and paddle_res[0] else []
+            return [(text, conf) for (_, text, conf) in self.easyocr_reader.readtext(image)]
+        except Exception as e:
+            logger.warning(f'  [OCR] {pass_name} error: {e}')
+            return []
+
+    @staticmethod
+    def is_ksa_plate(text):
+        """Whether cleaned text has the KSA layout: 3 letters + up to 4 digits."""
+        return bool(text) and KSA_PLATE_RE.match(text) is not None
+
+    @staticmethod
+    def clean_ksa_plate(raw_text):
+        """
+        Clean OCR text for KSA (Saudi Arabia) license plate format.
+        KSA plates: 3 Arabic letters + 4 digits  (e.g. أ ب ج 1234)
+        Converts Arabic-Indic digits (٠-٩) to Western digits (0-9).
+        """
+        if not raw_text:
+            return None
+
+        # Remove all special characters, keep Arabic letters + digits + spaces
+        text = re.sub(r'[^\u0600-\u06FF\u0660-\u0669\u06F0-\u06F90-9\s]', '', raw_text)
+
+        # Extract Arabic letters
+        arabic_letters = re.findall(r'[\u0600-\u06FF]', text)
+
+        # Extract digits (Arabic-Indic ٠-٩ and Western 0-9)
+        arabic_indic = re.findall(r'[\u0660-\u0669\u06F0-\u06F9]', text)
+        western_digits = re.findall(r'[0-9]', text)
+
+        # Convert Arabic-Indic digits → Western
+        indic_to_western = {
+            '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+            '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+            '۰': '0', '۱': '1', '۲': '2', '۳': '3', '۴': '4',
+            '۵': '5', '۶': '6', '۷': '7', '۸': '8', '۹': '9',
+        }
+        converted = [indic_to_western.get(d, d) for d in arabic_indic]
+        all_digits = western_digits + converted
+
+        # Format: up to 3 Arabic letters + up to 4 digits
+        letters_part = ' '.join(arabic_letters[:3]) if arabic_letters else ''
+        digits_part = ''.join(all_digits[:4]) if all_digits else ''
+
+        if letters_part and digits_part:
+            return f'{letters_part} {digits_part}'
+        elif digits_part:
+            return digits_part
+        elif letters_part:
+            return letters_part
+        else:
+            cleaned = ' '.join(text.split())
+            return cleaned if cleaned else None
+
+    @staticmethod
+    def resize_plate(plate_image):
+        """Resize a plate crop to a standard width for consistent OCR."""
+        h, w = plate_image.shape[:2]
+        target_w = 400
+        scale = target_w / max(w, 1)
+        return cv2.resize(plate_image, (target_w, int(h * scale)), interpolation=cv2.INTER_CUBIC)
+
+    @staticmethod
+    def binarize_plate(color_resized, profile='accurate'):
+        """
+        Enhanced binarization for KSA plates (CLAHE, denoise, Otsu).
+        Expects the output of resize_plate.
+
+        'accurate' denoises the contrast-enhanced plate with non-local means;
+        'fast' smooths it with an edge-preserving bilateral filter before
+        CLAHE, about 100x cheaper on a 400px plate.
+        """
+        # Grayscale
+        gray = cv2.cvtColor(color_resized, cv2.COLOR_BGR2GRAY)
+        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+
+        if profile == 'fast':
+            # Smooth first so CLAHE doesn't amplify the noise
+            denoised = clahe.apply(cv2.bilateralFilter(gray, 5, 50, 50))
+        else:
+            # CLAHE for contrast enhancement, then denoise
+            enhanced = clahe.apply(gray)
+            denoised = cv2.fastNlMeansDenoising(enhanced, None, h=12, templateWindowSize=7, searchWindowSize=21)
+
+        # Otsu's thresholding (better than adaptive for uniform plate backgrounds)
+        _, binary = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+        # Morphological close to fill small gaps in characters
+        kernel = np.ones((2, 2), np.uint8)
+        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+
+        return binary
+
+    @classmethod
+    def preprocess_plate(cls, plate_image, profile='accurate'):
+        """
+        Enhanced preprocessing for KSA plates.
+        Returns (color_resized, binary_image) for dual-OCR strategy.
+        """
+        color_resized = cls.resize_plate(plate_image)
+        return color_resized, cls.binarize_plate(color_resized, profile)
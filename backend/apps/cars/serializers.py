@@ -10,5 +10,25 @@ class CarSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Car
-        fields = ['id', 'plate', 'paid', 'video', 'analysis', 'created_at', 'updated_at']
-        read_only_fields = ['created_at', 'updated_at']
+        fields = [
+            'id', 'plate', 'paid', 'video', 'analysis',
+            'vehicle_count', 'plates_detected', 'faces_detected', 'analyzed_at',
+            'analysis_state', 'analysis_progress',
+            'created_at', 'updated_at',
+        ]
+        # Written by the analyzer only
+        read_only_fields = [
+            'analysis', 'vehicle_count', 'plates_detected', 'faces_detected', 'analyzed_at',
+            'analysis_state', 'analysis_progress',
+            'created_at', 'updated_at',
+        ]
+
+    def update(self, instance, validated_data):
+        """
+        Save only the fields sent: a full-row save would write back stale
+        analysis results and job state if an analysis finished meanwhile.
+        """
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
@@ -0,0 +1,459 @@
+import io
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+import cv2
+import numpy as np
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.cars.analyzer import VideoAnalyzer
+from apps.cars.jobs import STALE_ERROR, AnalysisJob, fail_stale_jobs
+from apps.cars.management.commands.analysis_worker import Command as AnalysisWorkerCommand
+from apps.cars.models import Car
+from apps.cars.plate_reader import PlateReader
+from apps.cars.serializers import CarSerializer
+from apps.cars.views import CarViewSet
+from apps.vehicles.models import DetectedVehicle
+from utils.ocr_cache import OCRCache, content_hash
+from utils.roi import RegionOfInterest
+
+
+def save_analysis(car, vehicles, plates=0):
+    """Store an analysis result for a car, as the analyzer does (no models needed)."""
+    processed = [
+        {
+            'vehicle_index': i, 'crop_image': f'car_{car.id}_v{i}.jpg',
+            'plate_image': f'plate_{car.id}_v{i}.jpg' if i < plates else None,
+            'plate_text': f'P{i}' if i < plates else None, 'car_color': 'White',
+            'driver_face_image': f'face_{car.id}_v{i}.jpg', 'vehicle_confidence': 0.9,
+            'plate_confidence': None, 'face_confidence': 1.0, 'timestamp': i,
+            'ocr_method': None, 'ocr_passes': 0, 'ocr_reads': 0,
+        }
+        for i in range(vehicles)
+    ]
+    return VideoAnalyzer.save_results(object.__new__(VideoAnalyzer), car, processed)
+
+
+class WithAnalysisTests(TestCase):
+    url = '/api/cars/with_analysis/'
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def add_cars(self, count, vehicles=2, paid=False):
+        start = Car.objects.count()
+        cars = []
+        for i in range(start, start + count):
+            car = Car.objects.create(plate=f'CAR-{i}', paid=paid)
+            save_analysis(car, vehicles)
+            cars.append(car)
+        return cars
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.add_cars(3)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.json()), 3)
+
+        self.add_cars(30)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.json()), 33)
+
+    def test_vehicle_count(self):
+        car, = self.add_cars(1, vehicles=3)
+        empty, = self.add_cars(1, vehicles=0)
+        counts = {row['id']: row['vehicle_count'] for row in self.client.get(self.url).json()}
+        self.assertEqual(counts, {car.id: 3, empty.id: 0})
+
+    def test_pagination(self):
+        self.add_cars(5)
+        with self.assertNumQueries(2):  # page count + page
+            response = self.client.get(self.url, {'page_size': 2, 'page': 2})
+        body = response.json()
+        self.assertEqual(body['count'], 5)
+        self.assertEqual(len(body['results']), 2)
+        self.assertEqual(body['results'][0]['vehicle_count'], 2)
+
+    def test_filters(self):
+        unpaid = self.add_cars(2)
+        paid = self.add_cars(1, paid=True)
+        old = unpaid[0]
+        Car.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=10))
+
+        ids = {row['id'] for row in self.client.get(self.url, {'paid': 'false'}).json()}
+        self.assertEqual(ids, {car.id for car in unpaid})
+        ids = {row['id'] for row in self.client.get(self.url, {'paid': 'true'}).json()}
+        self.assertEqual(ids, {paid[0].id})
+
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        ids = {row['id'] for row in self.client.get(self.url, {'date_from': since}).json()}
+        self.assertEqual(ids, {unpaid[1].id, paid[0].id})
+        ids = {row['id'] for row in self.client.get(self.url, {'date_to': since}).json()}
+        self.assertEqual(ids, {old.id})
+
+    def test_invalid_filters(self):
+        self.assertEqual(self.client.get(self.url, {'paid': 'maybe'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'date_from': '2024-13-40'}).status_code, 400)
+
+
+class AnalysisCountersTests(TestCase):
+
+    def test_counters_written_with_detections(self):
+        car = Car.objects.create(plate='ABC-1', video='1_a.mp4')
+        save_analysis(car, 3, plates=2)
+        car.refresh_from_db()
+        self.assertEqual((car.vehicle_count, car.plates_detected, car.faces_detected), (3, 2, 3))
+        self.assertIsNotNone(car.analyzed_at)
+        self.assertEqual(DetectedVehicle.objects.filter(video_id=car.id).count(), 3)
+
+        # A new analysis replaces the old rows and counters
+        save_analysis(car, 1)
+        car.refresh_from_db()
+        self.assertEqual((car.vehicle_count, car.plates_detected), (1, 0))
+        self.assertEqual(DetectedVehicle.objects.filter(video_id=car.id).count(), 1)
+
+    def test_analysis_status_reads_one_row(self):
+        car = Car.objects.create(plate='ABC-2', video='2_a.mp4')
+        url = f'/api/cars/analysis_status/?car_id={car.id}'
+        self.assertFalse(APIClient().get(url).json()['analyzed'])
+
+        save_analysis(car, 2)
+        with self.assertNumQueries(1):
+            body = APIClient().get(url).json()
+        self.assertTrue(body['analyzed'])
+        self.assertEqual(body['vehicle_count'], 2)
+
+
+class StaleSaveTests(TestCase):
+    """Edits made with a car loaded before its analysis finished keep the results."""
+
+    def setUp(self):
+        self.car = Car.objects.create(plate='STALE-1', video='1_a.mp4')
+        AnalysisJob(self.car.id).start()
+        self.stale = Car.objects.get(id=self.car.id)  # loaded while the job runs
+        save_analysis(self.car, 2)
+
+    def assert_results_kept(self):
+        car = Car.objects.get(id=self.car.id)
+        self.assertEqual((car.analysis_state, car.analysis_progress, car.vehicle_count), (Car.DONE, 100, 2))
+        return car
+
+    def test_mark_paid_and_unpaid(self):
+        with mock.patch.object(CarViewSet, 'get_object', return_value=self.stale):
+            APIClient().post(f'/api/cars/{self.car.id}/mark_paid/')
+        self.assertTrue(self.assert_results_kept().paid)
+
+        with mock.patch.object(CarViewSet, 'get_object', return_value=self.stale):
+            APIClient().post(f'/api/cars/{self.car.id}/mark_unpaid/')
+        self.assertFalse(self.assert_results_kept().paid)
+
+    def test_update(self):
+        serializer = CarSerializer(self.stale, data={'plate': 'STALE-2', 'vehicle_count': 0, 'analysis_state': 'running'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        car = self.assert_results_kept()
+        self.assertEqual((car.plate, car.plate_key), ('STALE-2', 'STALE2'))
+
+
+class UnknownLengthCapture:
+    """VideoCapture that reports no frame count, like some webm/mkv streams."""
+
+    def __init__(self, path):
+        self.cap = cv2.VideoCapture(path)
+
+    def get(self, prop):
+        return 0 if prop == cv2.CAP_PROP_FRAME_COUNT else self.cap.get(prop)
+
+    def __getattr__(self, name):
+        return getattr(self.cap, name)
+
+
+class NoVehicleYOLO:
+    def __call__(self, images, **kwargs):
+        return [SimpleNamespace(boxes=[], names={}) for _ in images]
+
+
+class AnalysisJobTests(TestCase):
+
+    def setUp(self):
+        self.car = Car.objects.create(plate='JOB-1', video='1_a.mp4')
+        self.url = f'/api/cars/analysis_status/?car_id={self.car.id}'
+
+    def status(self):
+        return APIClient().get(self.url).json()
+
+    def test_lifecycle(self):
+        self.assertEqual(self.status()['state'], Car.QUEUED)
+
+        job = AnalysisJob(self.car.id, interval=0)
+        job.start()
+        job.enter('scanning')
+        job.progress(0.5)
+        body = self.status()
+        self.assertEqual((body['state'], body['stage'], body['progress']), (Car.RUNNING, 'scanning', 40))
+        self.assertIsNotNone(body['started_at'])
+
+        save_analysis(self.car, 1)
+        body = self.status()
+        self.assertEqual((body['state'], body['progress'], body['analyzed']), (Car.DONE, 100, True))
+        self.assertIsNotNone(body['finished_at'])
+
+    def test_failure(self):
+        job = AnalysisJob(self.car.id)
+        job.start()
+        job.fail('Failed to open video')
+        body = self.status()
+        self.assertEqual((body['state'], body['error']), (Car.FAILED, 'Failed to open video'))
+        self.assertFalse(body['analyzed'])
+
+    def test_scan_of_unknown_length_video(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'stream.avi')
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+            for i in range(30):
+                writer.write(np.full((48, 64, 3), i * 8, np.uint8))
+            writer.release()
+
+            analyzer = object.__new__(VideoAnalyzer)
+            analyzer.batch_size = 4
+            analyzer.yolo_vehicle = NoVehicleYOLO()
+            progress = []
+            cap = UnknownLengthCapture(path)
+            try:
+                tracks, _, sampling = analyzer.scan_video(cap, path, on_progress=progress.append)
+            finally:
+                cap.release()
+
+        self.assertEqual(len(tracks), 0)
+        self.assertGreater(sampling['frames_analyzed'], 0)
+        self.assertEqual(progress, [])
+
+    def test_progress_is_throttled(self):
+        job = AnalysisJob(self.car.id, interval=60)
+        job.start()
+        job.enter('scanning')
+        with self.assertNumQueries(0):
+            for i in range(100):
+                job.progress(i / 100)
+
+    def test_heartbeat_without_progress(self):
+        job = AnalysisJob(self.car.id, interval=0)
+        job.start()
+        job.enter('scanning')
+        Car.objects.filter(id=self.car.id).update(analysis_heartbeat_at=timezone.now() - timedelta(minutes=1))
+        with self.assertNumQueries(1):
+            job.progress(0)
+        car = Car.objects.get(id=self.car.id)
+        self.assertGreater(car.analysis_heartbeat_at, timezone.now() - timedelta(seconds=10))
+        self.assertEqual(car.analysis_progress, 0)
+
+    @override_settings(ANALYSIS_PROGRESS_INTERVAL=2, ANALYSIS_STALE_INTERVALS=150)
+    def test_killed_job_is_reported_failed(self):
+        AnalysisJob(self.car.id).start()
+        self.assertEqual(self.status()['state'], Car.RUNNING)
+
+        # The analyzing process was killed: no state write for 5 minutes
+        Car.objects.filter(id=self.car.id).update(analysis_heartbeat_at=timezone.now() - timedelta(minutes=6))
+        body = self.status()
+        self.assertEqual((body['state'], body['error']), (Car.FAILED, STALE_ERROR))
+        self.assertIsNotNone(body['finished_at'])
+        self.assertEqual(Car.objects.get(id=self.car.id).analysis_state, Car.FAILED)
+
+    @override_settings(ANALYSIS_PROGRESS_INTERVAL=2, ANALYSIS_STALE_INTERVALS=150)
+    def test_worker_fails_only_stale_jobs(self):
+        other = Car.objects.create(plate='JOB-2', video='2_a.mp4')
+        AnalysisJob(self.car.id).start()
+        AnalysisJob(other.id).start()
+        Car.objects.filter(id=other.id).update(analysis_heartbeat_at=timezone.now() - timedelta(minutes=6))
+
+        self.assertEqual(fail_stale_jobs(), 1)
+        states = dict(Car.objects.values_list('id', 'analysis_state'))
+        self.assertEqual((states[self.car.id], states[other.id]), (Car.RUNNING, Car.FAILED))
+
+
+def plate_image(text):
+    """Synthetic 200x80 plate crop."""
+    image = np.full((80, 200, 3), 235, np.uint8)
+    cv2.rectangle(image, (3, 3), (196, 76), (20, 20, 20), 2)
+    cv2.putText(image, text, (12, 55), cv2.FONT_HERSHEY_SIMPLEX, 1.3, (20, 20, 20), 3)
+    return image
+
+
+class OCRCacheTests(SimpleTestCase):
+
+    def test_plates_one_character_apart_do_not_collide(self):
+        cache = OCRCache()
+        cache.put(content_hash(plate_image('ABC 1234')), {'text': 'ABC1234', 'confidence': 0.9, 'method': 'p'})
+
+        for text in ('ABC 1235', 'ABC 1284', 'ABD 1234'):
+            self.assertIsNone(cache.get(content_hash(plate_image(text))), text)
+        self.assertEqual(cache.get(content_hash(plate_image('ABC 1234')))['text'], 'ABC1234')
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_similar_crop_of_same_plate_is_a_miss(self):
+        cache = OCRCache()
+        image = plate_image('ABC 1234')
+        cache.put(content_hash(image), {'text': 'ABC1234', 'confidence': 0.9, 'method': 'p'})
+        self.assertIsNone(cache.get(content_hash(cv2.GaussianBlur(image, (3, 3), 0))))
+
+    def test_concurrent_saves_keep_all_entries(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'ocr_cache.json')
+            context = multiprocessing.get_context('fork')
+            workers = [context.Process(target=fill_cache, args=(path, n)) for n in range(4)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+            cache = OCRCache(path)
+            self.assertEqual(len(cache), 4 * 20)
+            self.assertEqual(sorted(os.listdir(tmp)), ['ocr_cache.json', 'ocr_cache.json.lock'])
+
+
+def fill_cache(path, worker):
+    """Save 20 readings one by one, as an OCR worker does (run in a child process)."""
+    cache = OCRCache(path)
+    for i in range(20):
+        cache.put(worker * 100 + i, {'text': f'P{worker}{i}', 'confidence': 0.9, 'method': 'p'})
+        cache.save()
+
+
+class CompactVehicleTests(SimpleTestCase):
+
+    def test_finished_vehicle_drops_padded_candidate_crops(self):
+        padded = np.zeros((120, 200, 3), np.uint8)
+        best = {
+            'score': 1.0, 'bbox': [10, 10, 190, 110], 'crop': padded, 'crop_bbox': [10, 10, 190, 110],
+            'confidence': 0.8, 'timestamp': 1.5, 'plate_conf': 0.6, 'plate_bbox': [60, 60, 120, 80],
+        }
+        plate = padded[70:90, 70:130]
+
+        vehicle = VideoAnalyzer.compact_vehicle(best, [plate])
+
+        self.assertEqual(vehicle['crop'].shape, (100, 180, 3))
+        self.assertEqual(vehicle['crop_bbox'], [0, 0, 180, 100])
+        self.assertFalse(np.shares_memory(vehicle['crop'], padded))
+        self.assertFalse(np.shares_memory(vehicle['plate_crops'][0], padded))
+        self.assertEqual(set(vehicle), {'crop', 'crop_bbox', 'confidence', 'timestamp', 'plate_conf', 'plate_crops'})
+
+
+class FrameSizeCapture:
+    def __init__(self, width, height):
+        self.size = {cv2.CAP_PROP_FRAME_WIDTH: width, cv2.CAP_PROP_FRAME_HEIGHT: height}
+
+    def get(self, prop):
+        return self.size.get(prop, 0)
+
+
+class RegionOfInterestTests(SimpleTestCase):
+
+    def test_off_frame_or_empty_regions_are_rejected(self):
+        for entry in (
+            {'rectangles': [[1.2, 0.0, 1.5, 1.0]]},  # right of the frame
+            {'rectangles': [[0.3, 0.5, 0.3, 0.9]]},  # no width
+            {'polygons': [[[-0.5, -0.5], [-0.1, -0.5], [-0.1, -0.1]]]},
+        ):
+            with self.assertRaises(ValueError, msg=entry):
+                RegionOfInterest.from_config(entry)
+
+        # Thin strip at the right edge: 6 columns of a 640 px frame, none of a 20 px one
+        roi = RegionOfInterest.from_config({'rectangles': [[0.99, 0.0, 1.0, 1.0]]})
+        self.assertEqual(roi.crop(np.zeros((480, 640, 3), np.uint8))[0].shape, (480, 6, 3))
+        with self.assertRaises(ValueError):
+            roi.crop(np.zeros((20, 20, 3), np.uint8))
+
+    def test_roi_without_pixels_falls_back_to_full_frame(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'camera_roi.json')
+            with open(path, 'w') as f:
+                f.write('{"1_*": {"rectangles": [[0.99, 0.0, 1.0, 1.0]]}}')
+            analyzer = object.__new__(VideoAnalyzer)
+            with override_settings(ANALYSIS_ROI_CONFIG=path):
+                self.assertIsNone(analyzer.camera_roi(FrameSizeCapture(20, 20), '1_a.mp4'))
+                self.assertIsNotNone(analyzer.camera_roi(FrameSizeCapture(640, 480), '1_a.mp4'))
+
+
+class FakePaddleOCR:
+    """PaddleOCR >= 2.7 stand-in: ocr() returns one result list per input image."""
+
+    def __init__(self):
+        self.recognizer_batches = []
+
+    def ocr(self, images, det=True, cls=True):
+        return [[(f'ABC{i}', 0.9)] for i, _ in enumerate(images)]
+
+    def text_recognizer(self, images):
+        self.recognizer_batches.append(len(images))
+        return [(f'أ ب ج {1000 + int(image[0, 0, 0])}', 0.9) for image in images], 0.01
+
+
+class PaddleRecognitionTests(SimpleTestCase):
+
+    def test_batch_gives_one_reading_per_plate(self):
+        reader = PlateReader(passes=['paddle_color'], batch_size=4)
+        reader.paddle_ocr = FakePaddleOCR()
+        images = [np.full((40, 120, 3), i, np.uint8) for i in range(6)]
+
+        results = reader.run_pass('paddle_color', images)
+
+        self.assertEqual(reader.paddle_ocr.recognizer_batches, [4, 2])
+        expected = [PlateReader.clean_ksa_plate(f'أ ب ج {1000 + i}') for i in range(6)]
+        self.assertEqual([r[0][0] for r in results], expected)
+
+
+class OCRDeadlineTests(SimpleTestCase):
+
+    def read_vehicles(self, deadline):
+        reader = PlateReader()
+        texts = iter(f'P{i}' for i in range(100))  # reads never agree
+        reader.read_many = lambda crops: [
+            {'text': next(texts), 'confidence': 0.5, 'method': 'p', 'passes': 1, 'cached': False} for _ in crops
+        ]
+        _, stats = reader.read_vehicles([['a', 'b', 'c'], ['d', 'e', 'f']], max_reads=3, deadline=deadline)
+        return stats['reads']
+
+    def test_extra_rounds_stop_at_the_video_deadline(self):
+        self.assertEqual(self.read_vehicles(time.time() + 60), 6)
+        # A group submitted after the video's deadline still gets its first read
+        self.assertEqual(self.read_vehicles(time.time() - 1), 2)
+
+
+class AnalysisWorkerTests(TestCase):
+
+    def worker(self):
+        worker = AnalysisWorkerCommand(stdout=io.StringIO(), stderr=io.StringIO())
+        worker.analyzer = mock.Mock()
+        worker.load_models = lambda: None
+        return worker
+
+    def test_a_car_is_claimed_once(self):
+        car = Car.objects.create(plate='Q-1', video='1_a.mp4')
+        first, second = self.worker(), self.worker()
+        self.assertEqual(first.next_car().id, car.id)
+        self.assertIsNone(second.next_car())
+        self.assertEqual(Car.objects.get(id=car.id).analysis_state, Car.RUNNING)
+
+    def test_loop_survives_database_errors(self):
+        worker = self.worker()
+        calls = []
+
+        def next_car():
+            calls.append(1)
+            if len(calls) == 1:
+                raise OperationalError('server closed the connection unexpectedly')
+            raise KeyboardInterrupt
+
+        worker.next_car = next_car
+        with mock.patch('apps.cars.management.commands.analysis_worker.time.sleep') as sleep:
+            worker.handle(poll_interval=2)
+        self.assertEqual(len(calls), 2)
+        sleep.assert_called_once_with(4)
+        worker.analyzer.close.assert_called_once()
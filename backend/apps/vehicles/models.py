@@ -3,6 +3,7 @@ Vehicles app models for detected vehicles and analysis.
 """
 from django.db import models
 from apps.cars.models import Car
+from utils.plate_normalizer import normalize_plate
 
 
 class DetectedVehicle(models.Model):
@@ -13,6 +14,8 @@ class DetectedVehicle(models.Model):
     crop_image = models.CharField(max_length=255, null=True, blank=True)
     plate_image = models.CharField(max_length=255, null=True, blank=True)
     plate_text = models.CharField(max_length=50, null=True, blank=True, db_index=True)
+    # normalize_plate(plate_text): plate lookups match on this key
+    plate_key = models.CharField(max_length=50, blank=True, default='', db_index=True, editable=False)
     car_color = models.CharField(max_length=50, null=True, blank=True)
     driver_face_image = models.CharField(max_length=255, null=True, blank=True)
     vehicle_confidence = models.FloatField(default=0.0)
@@ -32,3 +35,10 @@ class DetectedVehicle(models.Model):
 
     def __str__(self):
         return f"Vehicle {self.id} - Video {self.video_id} - Plate: {self.plate_text}"
+
+    def save(self, *args, **kwargs):
+        self.plate_key = normalize_plate(self.plate_text)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'plate_text' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'plate_key'}
+        super().save(*args, **kwargs)
@@ -14,7 +14,8 @@ import logging
 from apps.vehicles.models import DetectedVehicle
 from apps.vehicles.serializers import DetectedVehicleSerializer
 from apps.cars.models import Car
-from utils.image_enhancement import PlateImageEnhancer
+from utils.image_enhancement import ADVANCED_VARIANTS, PlateImageEnhancer, parallel_map
+from utils.plate_normalizer import normalize_plate
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +28,14 @@ class DetectedVehicleViewSet(viewsets.ModelViewSet):
     parser_classes = (MultiPartParser, FormParser)
     filterset_fields = ['video_id', 'plate_text', 'car_color']
 
+    def get_queryset(self):
+        """Optionally filter by plate (?plate=...), matched on the normalized plate key."""
+        queryset = super().get_queryset()
+        plate = self.request.query_params.get('plate')
+        if plate:
+            queryset = queryset.filter(plate_key=normalize_plate(plate))
+        return queryset
+
     @action(detail=True, methods=['post'])
     def enhance_plate(self, request, pk=None):
         """
@@ -34,10 +43,21 @@ class DetectedVehicleViewSet(viewsets.ModelViewSet):
         
         Query parameters:
             - method: 'basic' (default) or 'advanced'
+            - variant: advanced variant to use (default: 'enhanced'); only
+              the stages it needs are computed
             - save: 'true' to save enhanced image back to vehicle
         """
         vehicle = self.get_object()
         
+        # Determine enhancement method
+        method = request.query_params.get('method', 'basic')
+        variant = request.query_params.get('variant', 'enhanced')
+        if method == 'advanced' and variant not in ADVANCED_VARIANTS:
+            return Response(
+                {'error': f'Unknown variant. Allowed: {", ".join(ADVANCED_VARIANTS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         if not vehicle.plate_image:
             return Response(
                 {'error': 'Vehicle has no plate image'},
@@ -66,18 +86,15 @@ class DetectedVehicleViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Determine enhancement method
-            method = request.query_params.get('method', 'basic')
-            
             if method == 'advanced':
-                result = PlateImageEnhancer.enhance_advanced(image)
+                # Compute only the requested variant (default: the CLAHE version)
+                result = PlateImageEnhancer.enhance_advanced(image, [variant])
                 if not result:
                     return Response(
                         {'error': 'Enhancement failed'},
                         status=status.HTTP_400_BAD_REQUEST
                     )
-                # Use the enhanced (CLAHE) version for best results
-                enhanced = result.get('enhanced', image)
+                enhanced = result.get(variant, image)
             else:
                 # Basic enhancement (default)
                 enhanced = PlateImageEnhancer.enhance_basic(image)
@@ -146,56 +163,33 @@ class DetectedVehicleViewSet(viewsets.ModelViewSet):
             
             should_save = request.query_params.get('save', 'false').lower() == 'true'
             
-            # Enhance crop image
-            if vehicle.crop_image:
-                try:
-                    crop_path = os.path.join(
-                        settings.MEDIA_ROOT,
-                        str(vehicle.crop_image)
-                    )
-                    if os.path.exists(crop_path):
-                        image = cv2.imread(crop_path)
-                        if image is not None:
-                            enhanced = PlateImageEnhancer.enhance_basic(image)
-                            if should_save and enhanced is not None:
-                                cv2.imwrite(crop_path, enhanced)
-                                results['crop']['enhanced'] = True
-                except Exception as e:
-                    logger.warning(f"Error enhancing crop image: {e}")
+            paths = {
+                name: os.path.join(settings.MEDIA_ROOT, str(filename))
+                for name, filename in (
+                    ('crop', vehicle.crop_image),
+                    ('plate', vehicle.plate_image),
+                    ('face', vehicle.driver_face_image),
+                )
+                if filename
+            }
+            paths = {name: path for name, path in paths.items() if os.path.exists(path)}
             
-            # Enhance plate image
-            if vehicle.plate_image:
+            # Read, enhance and write the images in parallel (OpenCV releases the GIL)
+            def enhance(item):
+                name, path = item
                 try:
-                    plate_path = os.path.join(
-                        settings.MEDIA_ROOT,
-                        str(vehicle.plate_image)
-                    )
-                    if os.path.exists(plate_path):
-                        image = cv2.imread(plate_path)
-                        if image is not None:
-                            enhanced = PlateImageEnhancer.enhance_basic(image)
-                            if should_save and enhanced is not None:
-                                cv2.imwrite(plate_path, enhanced)
-                                results['plate']['enhanced'] = True
+                    image = cv2.imread(path)
+                    if image is None:
+                        return False
+                    enhanced = PlateImageEnhancer.enhance_basic(image)
+                    if should_save and enhanced is not None:
+                        return bool(cv2.imwrite(path, enhanced))
                 except Exception as e:
-                    logger.warning(f"Error enhancing plate image: {e}")
+                    logger.warning(f"Error enhancing {name} image: {e}")
+                return False
             
-            # Enhance face image
-            if vehicle.driver_face_image:
-                try:
-                    face_path = os.path.join(
-                        settings.MEDIA_ROOT,
-                        str(vehicle.driver_face_image)
-                    )
-                    if os.path.exists(face_path):
-                        image = cv2.imread(face_path)
-                        if image is not None:
-                            enhanced = PlateImageEnhancer.enhance_basic(image)
-                            if should_save and enhanced is not None:
-                                cv2.imwrite(face_path, enhanced)
-                                results['face']['enhanced'] = True
-                except Exception as e:
-                    logger.warning(f"Error enhancing face image: {e}")
+            for name, ok in zip(paths, parallel_map(enhance, paths.items())):
+                results[name]['enhanced'] = ok
             
             return Response(
                 {
@@ -19,6 +19,13 @@ done
 
 echo "=== Database is ready! ==="
 
+# Analysis worker container (docker-compose service analysis-worker): the API
+# container runs the migrations, the worker retries until they are applied
+if [ "$1" = "worker" ]; then
+    echo "=== Starting analysis worker... ==="
+    exec python manage.py analysis_worker
+fi
+
 echo "=== Running migrations... ==="
 python manage.py migrate --noinput
 
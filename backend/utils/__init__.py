@@ -7,11 +7,46 @@ from .image_enhancement import (
     enhance_plate_image_basic,
     enhance_plate_image_advanced,
     enhance_from_file,
+    parallel_map,
 )
+from .frame_sampler import (
+    BackgroundIterator,
+    FrameSampler,
+    MotionSampler,
+    batched,
+    plan_segments,
+    probe_gop_size,
+    probe_keyframes,
+)
+from .candidate_store import CandidateStore
+from .cpu_quota import available_cpus
+from .vehicle_tracker import IoUTracker, iou_matrix, link_track_spans
+from .roi import RegionOfInterest, load_roi_config, roi_for_video
+from .ocr_cache import OCRCache, content_hash
+from .plate_normalizer import normalize_plate
 
 __all__ = [
     'PlateImageEnhancer',
     'enhance_plate_image_basic',
     'enhance_plate_image_advanced',
     'enhance_from_file',
+    'parallel_map',
+    'FrameSampler',
+    'MotionSampler',
+    'probe_gop_size',
+    'probe_keyframes',
+    'plan_segments',
+    'batched',
+    'BackgroundIterator',
+    'CandidateStore',
+    'available_cpus',
+    'IoUTracker',
+    'iou_matrix',
+    'link_track_spans',
+    'RegionOfInterest',
+    'load_roi_config',
+    'roi_for_video',
+    'OCRCache',
+    'content_hash',
+    'normalize_plate',
 ]
@@ -0,0 +1,117 @@
+"""
+Bounded Candidate Store for Video Analysis
+
+Keeps the best candidates (image crop + metadata) per key under a hard
+memory budget. When the crops stored exceed the budget, the lowest-scoring
+candidates are evicted, so memory stays flat regardless of video length or
+resolution.
+"""
+
+from typing import Dict, Iterator, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CandidateStore:
+    """
+    Top-scoring candidates per key with a memory budget.
+
+    Each candidate is a dict with at least:
+    - 'score': float used for replacement and eviction
+    - 'crop': np.ndarray image (its nbytes count against the budget)
+
+    Eviction drops the lowest-scoring spare candidates (not the best of their
+    key) first, and only then the best candidate of the weakest key.
+    """
+
+    def __init__(self, max_bytes: int, per_key: int = 1):
+        """
+        Args:
+            max_bytes: Maximum total size of stored crops in bytes
+            per_key: Number of candidates kept per key
+        """
+        self.max_bytes = max(0, int(max_bytes))
+        self.per_key = max(1, int(per_key))
+        self.nbytes = 0
+        self.peak_bytes = 0
+        self.evicted = 0
+        self._candidates: Dict[str, List[dict]] = {}
+
+    def accepts(self, key: str, score: float) -> bool:
+        """Whether a candidate with `score` would be stored for `key`."""
+        candidates = self._candidates.get(key, [])
+        return len(candidates) < self.per_key or score > candidates[-1]['score']
+
+    def offer(self, key: str, candidate: dict) -> bool:
+        """
+        Store `candidate` if it ranks among the top `per_key` for `key`.
+
+        Args:
+            key: Candidate key (e.g. vehicle track ID)
+            candidate: Candidate dict with 'score' and 'crop'
+
+        Returns:
+            True if the candidate was stored (and not immediately evicted)
+        """
+        if not self.accepts(key, candidate['score']):
+            return False
+
+        candidates = self._candidates.setdefault(key, [])
+        if len(candidates) == self.per_key:
+            self._remove(key, candidates[-1])
+            candidates = self._candidates.setdefault(key, [])
+
+        candidates.append(candidate)
+        candidates.sort(key=lambda c: c['score'], reverse=True)
+        self.nbytes += candidate['crop'].nbytes
+        self.peak_bytes = max(self.peak_bytes, self.nbytes)
+
+        while self.nbytes > self.max_bytes and self._candidates:
+            victim_key, victim = self._eviction_victim()
+            self._remove(victim_key, victim)
+            self.evicted += 1
+            logger.debug(f"Evicted candidate of {victim_key} (budget {self.max_bytes} bytes)")
+
+        return any(c is candidate for c in self._candidates.get(key, []))
+
+    def _eviction_victim(self) -> Tuple[str, dict]:
+        spares = [(k, c) for k, cs in self._candidates.items() for c in cs[1:]]
+        if spares:
+            return min(spares, key=lambda kc: kc[1]['score'])
+        key = min(self._candidates, key=lambda k: self._candidates[k][0]['score'])
+        return key, self._candidates[key][0]
+
+    def _remove(self, key: str, candidate: dict) -> None:
+        candidates = self._candidates.get(key, [])
+        for i, c in enumerate(candidates):
+            if c is candidate:
+                del candidates[i]
+                self.nbytes -= candidate['crop'].nbytes
+                break
+        if not candidates:
+            self._candidates.pop(key, None)
+
+    def pop(self, key: str) -> List[dict]:
+        """Remove and return the candidates of `key` (best first), e.g. when its track is final."""
+        candidates = self._candidates.pop(key, [])
+        self.nbytes -= sum(c['crop'].nbytes for c in candidates)
+        return candidates
+
+    def best(self, key: str) -> Optional[dict]:
+        """Highest-scoring candidate for `key`, or None."""
+        candidates = self._candidates.get(key)
+        return candidates[0] if candidates else None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._candidates
+
+    def __getitem__(self, key: str) -> List[dict]:
+        return list(self._candidates[key])
+
+    def __len__(self) -> int:
+        return len(self._candidates)
+
+    def items(self) -> Iterator[Tuple[str, List[dict]]]:
+        """(key, candidates sorted by score, best first) pairs."""
+        return iter([(k, list(cs)) for k, cs in self._candidates.items()])
@@ -0,0 +1,57 @@
+"""
+CPU Quota Utilities
+
+os.cpu_count() reports the host's CPUs, not the container's limit
+(docker-compose `cpus: '4'`). These helpers read the cgroup CPU quota so
+worker pools and thread counts can be sized to what the container may use.
+"""
+
+import os
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    """CPU limit from cgroup v2 (cpu.max) or v1 (cfs quota), None if unlimited."""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max':
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+
+def available_cpus() -> int:
+    """
+    Number of CPUs this process may use.
+
+    Returns:
+        min(CPU affinity, cgroup quota), at least 1
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(1, int(limit)))
+
+    logger.debug(f"Available CPUs: {cpus}")
+    return max(1, cpus)
@@ -0,0 +1,394 @@
+"""
+Frame Sampling Utilities for Video Analysis
+
+This module reads every N-th frame of a video. Seeking with
+CAP_PROP_POS_FRAMES on H.264/HEVC jumps back to the previous keyframe and
+re-decodes the whole GOP for every sample, so the default strategy reads the
+stream forward once, using grab() to skip frames and retrieve() to decode
+only the sampled ones. Seeking is only used when the stride is longer than
+the GOP, where it really skips work.
+
+MotionSampler adapts the sampling rate to the scene: frames without motion
+are dropped before they reach the detector.
+"""
+
+import queue
+import subprocess
+import threading
+import time
+import cv2
+import numpy as np
+from typing import Iterable, Iterator, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def probe_keyframes(video_path: str, probe_seconds: Optional[int] = None) -> Optional[List[int]]:
+    """
+    Find keyframe positions of a video with ffprobe.
+
+    Only packet headers are read, nothing is decoded, so this is cheap even
+    for long videos. Positions are packet (decode-order) indices, which match
+    frame indices up to B-frame reordering.
+
+    Args:
+        video_path: Path to the video file
+        probe_seconds: Only inspect the first `probe_seconds` (None = whole video)
+
+    Returns:
+        Keyframe indices, or None if ffprobe is unavailable or fails
+    """
+    command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0']
+    if probe_seconds:
+        command += ['-read_intervals', f'%+{probe_seconds}']
+    command += ['-show_entries', 'packet=flags', '-of', 'csv=p=0', video_path]
+
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, timeout=60).stdout
+    except Exception as e:
+        logger.debug(f"ffprobe not available: {e}")
+        return None
+
+    keyframes = [i for i, flags in enumerate(output.split()) if 'K' in flags]
+    return keyframes or None
+
+
+def probe_gop_size(video_path: str, probe_seconds: int = 30) -> Optional[int]:
+    """
+    Estimate the GOP size (frames between keyframes) of a video.
+
+    Args:
+        video_path: Path to the video file
+        probe_seconds: How much of the video to inspect
+
+    Returns:
+        Largest keyframe interval in frames, or None if it can't be determined
+    """
+    keyframes = probe_keyframes(video_path, probe_seconds)
+    if not keyframes or len(keyframes) < 2:
+        return None
+
+    return max(b - a for a, b in zip(keyframes, keyframes[1:]))
+
+
+def plan_segments(
+    frame_count: int,
+    segments: int,
+    keyframes: Optional[List[int]] = None,
+) -> List[Tuple[int, int]]:
+    """
+    Split a video into contiguous [start, end) frame ranges.
+
+    Boundaries are snapped to the nearest keyframe when keyframes are known,
+    so each segment starts with a cheap, exact seek.
+
+    Args:
+        frame_count: Number of frames in the video
+        segments: Desired number of segments
+        keyframes: Keyframe indices (see probe_keyframes)
+
+    Returns:
+        List of (start_frame, end_frame) tuples covering the whole video
+    """
+    if frame_count <= 0 or segments <= 1:
+        return [(0, frame_count)]
+
+    bounds = []
+    for k in range(1, segments):
+        bound = frame_count * k // segments
+        if keyframes:
+            bound = min(keyframes, key=lambda f: abs(f - bound))
+        if 0 < bound < frame_count and (not bounds or bound > bounds[-1]):
+            bounds.append(bound)
+
+    edges = [0] + bounds + [frame_count]
+    return list(zip(edges, edges[1:]))
+
+
+class FrameSampler:
+    """
+    Yields every `stride`-th frame of an opened cv2.VideoCapture.
+
+    Modes:
+    - 'sequential': read forward once, grab() skipped frames, retrieve() sampled ones
+    - 'seek': CAP_PROP_POS_FRAMES before every sampled frame
+    - 'auto': 'seek' only when the stride is longer than the GOP, else 'sequential'
+    """
+
+    SEQUENTIAL = 'sequential'
+    SEEK = 'seek'
+    AUTO = 'auto'
+    MODES = (SEQUENTIAL, SEEK, AUTO)
+
+    def __init__(
+        self,
+        cap: cv2.VideoCapture,
+        stride: int,
+        frame_count: Optional[int] = None,
+        mode: str = AUTO,
+        gop_size: Optional[int] = None,
+        start_frame: int = 0,
+        end_frame: Optional[int] = None,
+    ):
+        """
+        Args:
+            cap: Opened video capture, positioned at the first frame
+            stride: Sample one frame every `stride` frames
+            frame_count: Number of frames in the video (None = read until EOF)
+            mode: 'sequential', 'seek' or 'auto'
+            gop_size: Keyframe interval used by 'auto' (see probe_gop_size)
+            start_frame: First frame of the range to sample (segment start)
+            end_frame: End of the range to sample, exclusive (None = end of video)
+
+        Sampled frame indices are always multiples of `stride` counted from the
+        start of the video, so segments sample exactly the frames a full pass would.
+        """
+        if mode not in self.MODES:
+            logger.warning(f"Unknown frame sampling mode: {mode}, using auto")
+            mode = self.AUTO
+
+        self.cap = cap
+        self.stride = max(1, int(stride))
+        self.frame_count = frame_count if frame_count and frame_count > 0 else None
+        self.start_frame = max(0, int(start_frame))
+        self.end_frame = self.frame_count
+        if end_frame is not None:
+            self.end_frame = end_frame if self.frame_count is None else min(end_frame, self.frame_count)
+        self.gop_size = gop_size
+        self.mode = self.resolve_mode(mode)
+        self.frames_decoded = 0
+
+    def resolve_mode(self, mode: str) -> str:
+        """Pick the concrete decode strategy for 'auto'."""
+        if mode != self.AUTO:
+            return mode
+        if self.gop_size and self.stride > self.gop_size:
+            return self.SEEK
+        return self.SEQUENTIAL
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        if self.mode == self.SEEK:
+            return self._iter_seek()
+        return self._iter_sequential()
+
+    def batches(self, batch_size: int) -> Iterator[List[Tuple[int, np.ndarray]]]:
+        """
+        Group sampled frames into lists of up to `batch_size` (frame_idx, frame).
+
+        Args:
+            batch_size: Frames per batch (the last batch may be smaller)
+        """
+        return batched(self, batch_size)
+
+    def _iter_sequential(self) -> Iterator[Tuple[int, np.ndarray]]:
+        frame_idx = self.start_frame
+        if frame_idx > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+        while self.end_frame is None or frame_idx < self.end_frame:
+            if not self.cap.grab():
+                break
+            if frame_idx % self.stride == 0:
+                ret, frame = self.cap.retrieve()
+                if ret:
+                    self.frames_decoded += 1
+                    yield frame_idx, frame
+            frame_idx += 1
+
+    def _iter_seek(self) -> Iterator[Tuple[int, np.ndarray]]:
+        if self.end_frame is None:
+            # Without a frame count there is nothing to seek to
+            yield from self._iter_sequential()
+            return
+
+        first = -(-self.start_frame // self.stride) * self.stride
+        for frame_idx in range(first, self.end_frame, self.stride):
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            ret, frame = self.cap.read()
+            if not ret:
+                continue
+            self.frames_decoded += 1
+            yield frame_idx, frame
+
+
+class MotionSampler:
+    """
+    Motion-adaptive sampling on top of a FrameSampler.
+
+    The wrapped sampler decodes frames at the maximum sampling rate. Each
+    frame is compared with the previous one on a small blurred grayscale
+    copy (cheap frame differencing); frames are only passed on while there
+    is motion (and for `hold_frames` after it stops), plus one frame every
+    `idle_stride` frames when the scene is static. Static stretches of video
+    therefore never reach the detector.
+
+    Counters:
+    - frames_checked: frames compared for motion
+    - frames_sampled: frames passed on to the detector
+    - frames_skipped: frames dropped because nothing changed
+    """
+
+    def __init__(
+        self,
+        sampler: FrameSampler,
+        idle_stride: Optional[int] = None,
+        motion_threshold: float = 0.005,
+        hold_frames: int = 0,
+        pixel_threshold: int = 25,
+        width: int = 160,
+        roi=None,
+    ):
+        """
+        Args:
+            sampler: FrameSampler at the maximum sampling rate
+            idle_stride: Sample one frame every `idle_stride` frames without
+                motion (None = skip static frames entirely)
+            motion_threshold: Fraction of changed pixels that counts as motion
+            hold_frames: Frames to keep sampling at the maximum rate after motion
+            pixel_threshold: Gray-level difference for a pixel to count as changed
+            width: Width of the downscaled frames used for differencing
+            roi: Only look for motion inside this RegionOfInterest (see utils.roi)
+        """
+        self.sampler = sampler
+        self.idle_stride = idle_stride
+        self.motion_threshold = motion_threshold
+        self.hold_frames = max(0, int(hold_frames))
+        self.pixel_threshold = pixel_threshold
+        self.width = width
+        self.roi = roi
+        self.frames_checked = 0
+        self.frames_sampled = 0
+        self.frames_skipped = 0
+
+    def _small_gray(self, frame: np.ndarray) -> np.ndarray:
+        if self.roi is not None:
+            frame, _ = self.roi.crop(frame)
+        h, w = frame.shape[:2]
+        height = max(1, int(h * self.width / max(w, 1)))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def motion(self, previous: Optional[np.ndarray], current: np.ndarray) -> float:
+        """Fraction of pixels that changed between two downscaled gray frames."""
+        if previous is None:
+            return 1.0
+        changed = cv2.absdiff(previous, current) > self.pixel_threshold
+        return float(np.count_nonzero(changed)) / changed.size
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        previous = None
+        last_sampled = None
+        active_until = -1
+        for frame_idx, frame in self.sampler:
+            self.frames_checked += 1
+            current = self._small_gray(frame)
+            if self.motion(previous, current) >= self.motion_threshold:
+                active_until = frame_idx + self.hold_frames
+            previous = current
+
+            idle_due = self.idle_stride is not None and (
+                last_sampled is None or frame_idx - last_sampled >= self.idle_stride
+            )
+            if frame_idx <= active_until or idle_due:
+                last_sampled = frame_idx
+                self.frames_sampled += 1
+                yield frame_idx, frame
+            else:
+                self.frames_skipped += 1
+
+
+def batched(items: Iterable, batch_size: int) -> Iterator[list]:
+    """
+    Group items into lists of up to `batch_size`.
+
+    Args:
+        items: Any iterable (e.g. a FrameSampler or BackgroundIterator)
+        batch_size: Items per batch (the last batch may be smaller)
+    """
+    batch_size = max(1, int(batch_size))
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BackgroundIterator:
+    """
+    Runs an iterator (e.g. a FrameSampler) in a background thread and hands
+    its items over through a bounded queue.
+
+    Video decode releases the GIL, so decoding the next frames overlaps with
+    inference on the current ones. The bounded queue applies backpressure:
+    the producer blocks when the consumer falls behind.
+
+    Wait times per stage:
+    - producer_wait: seconds the producer was blocked on a full queue
+      (the consumer is the bottleneck)
+    - consumer_wait: seconds the consumer was blocked on an empty queue
+      (the producer is the bottleneck)
+    """
+
+    _DONE = object()
+
+    def __init__(self, items: Iterable, maxsize: int = 16, name: str = 'frame-decoder'):
+        """
+        Args:
+            items: Iterable to consume in the background thread
+            maxsize: Queue capacity (items buffered ahead of the consumer)
+            name: Thread name
+        """
+        self.queue = queue.Queue(maxsize=max(1, int(maxsize)))
+        self.producer_wait = 0.0
+        self.consumer_wait = 0.0
+        self.items = 0
+        self._error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, args=(items,), name=name, daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> None:
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.producer_wait += time.perf_counter() - start
+
+    def _produce(self, items: Iterable) -> None:
+        try:
+            for item in items:
+                if self._stop.is_set():
+                    break
+                self._put(item)
+        except Exception as e:
+            logger.error(f"Error in background iterator: {e}")
+            self._error = e
+        finally:
+            self._put(self._DONE)
+
+    def __iter__(self) -> Iterator:
+        try:
+            while True:
+                start = time.perf_counter()
+                item = self.queue.get()
+                self.consumer_wait += time.perf_counter() - start
+                if item is self._DONE:
+                    break
+                self.items += 1
+                yield item
+            if self._error is not None:
+                raise self._error
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Stop the producer and wait for its thread to exit."""
+        self._stop.set()
+        self._thread.join()
@@ -5,13 +5,96 @@ This module provides advanced image enhancement techniques for improving
 low-quality license plate images before OCR processing.
 """
 
+import threading
 import cv2
 import numpy as np
-from typing import Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional
 import logging
 
+from .cpu_quota import available_cpus
+
 logger = logging.getLogger(__name__)
 
+# enhance_advanced variants: name -> stage it is computed from
+ADVANCED_VARIANTS = {
+    'original': None,
+    'denoised': 'original',
+    'enhanced': 'denoised',
+    'deskewed': 'enhanced',
+    'sharpened': 'deskewed',
+    'otsu_binary': 'sharpened',
+    'adaptive_binary': 'sharpened',
+    'otsu_morph': 'otsu_binary',
+    'adaptive_morph': 'adaptive_binary',
+}
+
+_local = threading.local()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _thread_pool() -> ThreadPoolExecutor:
+    """Shared enhancement thread pool, one thread per available CPU."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=available_cpus(), thread_name_prefix='enhance')
+    return _executor
+
+
+def parallel_map(func: Callable, items: Iterable) -> List:
+    """
+    Apply `func` to every item on the shared thread pool.
+
+    OpenCV releases the GIL, so image work (decode, filters, encode) runs on
+    all CPUs of the quota. Must not be called from inside a pool task.
+
+    Returns:
+        Results in input order
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    return list(_thread_pool().map(func, items))
+
+
+def _clahe(clip_limit: float, tile_grid_size: tuple = (8, 8)):
+    """
+    CLAHE instance for a parameter set, created once per thread
+    (apply() reuses internal buffers, so instances are not shared between threads).
+    """
+    cache = getattr(_local, 'clahe', None)
+    if cache is None:
+        cache = _local.clahe = {}
+    key = (clip_limit, tuple(tile_grid_size))
+    clahe = cache.get(key)
+    if clahe is None:
+        clahe = cache[key] = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tuple(tile_grid_size))
+    return clahe
+
+
+@lru_cache(maxsize=None)
+def _structuring_element(shape: int, size: tuple) -> np.ndarray:
+    """Read-only structuring element, built once per shape and size."""
+    kernel = cv2.getStructuringElement(shape, size)
+    kernel.setflags(write=False)
+    return kernel
+
+
+@lru_cache(maxsize=None)
+def _sharpen_kernel(strength: float) -> np.ndarray:
+    """Read-only unsharp masking kernel, built once per strength."""
+    kernel = np.array([
+        [-1, -1, -1],
+        [-1,  9 * strength, -1],
+        [-1, -1, -1]
+    ], dtype=np.float32)
+    kernel.setflags(write=False)
+    return kernel
+
 
 class PlateImageEnhancer:
     """
@@ -48,8 +131,7 @@ class PlateImageEnhancer:
                 gray = image.copy()
             
             # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            enhanced = clahe.apply(gray)
+            enhanced = _clahe(2.0).apply(gray)
             logger.debug("Applied CLAHE enhancement")
             
             # Denoise the image
@@ -62,7 +144,69 @@ class PlateImageEnhancer:
             return image
     
     @staticmethod
-    def enhance_advanced(image: np.ndarray) -> Dict[str, np.ndarray]:
+    def enhance_color(image: np.ndarray, clip_limit: float = 3.0) -> np.ndarray:
+        """
+        CLAHE on the lightness channel of a color image (keeps the colors).
+        
+        Args:
+            image: Input image (BGR)
+            clip_limit: CLAHE clipping limit
+            
+        Returns:
+            Enhanced BGR image
+        """
+        if image is None or image.size == 0:
+            logger.warning("Empty or None image provided")
+            return None
+        
+        try:
+            lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+            l, a, b = cv2.split(lab)
+            l = _clahe(clip_limit).apply(l)
+            return cv2.cvtColor(cv2.merge([l, a, b]), cv2.COLOR_LAB2BGR)
+        except Exception as e:
+            logger.error(f"Error in color enhancement: {e}")
+            return image
+    
+    @staticmethod
+    def enhance_many(
+        images: Iterable[np.ndarray],
+        method: str = 'basic',
+        variants: Optional[Iterable[str]] = None,
+    ) -> List:
+        """
+        Enhance several images in parallel on a thread pool sized to the
+        CPU quota.
+        
+        Args:
+            images: Input images
+            method: 'basic', 'advanced' (see enhance_advanced) or 'color'
+                (see enhance_color)
+            variants: Variants for 'advanced' (default: all)
+            
+        Returns:
+            One result per image, in input order (None for failed images)
+        """
+        if method == 'basic':
+            enhance = PlateImageEnhancer.enhance_basic
+        elif method == 'advanced':
+            variants = None if variants is None else list(variants)
+            unknown = [v for v in variants or [] if v not in ADVANCED_VARIANTS]
+            if unknown:
+                raise ValueError(f"Unknown enhancement variants: {unknown}")
+            enhance = lambda image: PlateImageEnhancer.enhance_advanced(image, variants)
+        elif method == 'color':
+            enhance = PlateImageEnhancer.enhance_color
+        else:
+            raise ValueError(f"Unknown enhancement method: {method}")
+        
+        return parallel_map(enhance, images)
+    
+    @staticmethod
+    def enhance_advanced(
+        image: np.ndarray,
+        variants: Optional[Iterable[str]] = None,
+    ) -> Dict[str, np.ndarray]:
         """
         Advanced multi-stage enhancement with multiple output variants.
         
@@ -74,87 +218,83 @@ class PlateImageEnhancer:
         5. Thresholding - Convert to binary images
         6. Morphology - Clean artifacts
         
+        Only the stages the requested variants depend on are run, e.g.
+        'enhanced' costs denoising + CLAHE.
+        
         Args:
             image: Input image (BGR or grayscale)
+            variants: Names from ADVANCED_VARIANTS to compute (default: all)
             
         Returns:
-            Dictionary with multiple enhanced versions
+            Dictionary with the requested enhanced versions
         """
+        variants = list(ADVANCED_VARIANTS) if variants is None else list(variants)
+        unknown = [v for v in variants if v not in ADVANCED_VARIANTS]
+        if unknown:
+            raise ValueError(f"Unknown enhancement variants: {unknown}")
+        
         if image is None or image.size == 0:
             logger.warning("Empty or None image provided")
             return None
         
         try:
+            stages = {}
+            
+            def stage(name):
+                if name not in stages:
+                    source = ADVANCED_VARIANTS[name]
+                    stages[name] = PlateImageEnhancer._run_stage(
+                        name, image if source is None else stage(source)
+                    )
+                    logger.debug(f"Stage {name} complete")
+                return stages[name]
+            
+            results = {name: stage(name) for name in variants}
+            logger.debug(f"Advanced enhancement complete: {list(stages)}")
+            return results
+        
+        except Exception as e:
+            logger.error(f"Error in advanced enhancement: {e}")
+            return None
+    
+    @staticmethod
+    def _run_stage(name: str, source: np.ndarray) -> np.ndarray:
+        """Compute one enhance_advanced variant from the stage it depends on."""
+        if name == 'original':
             # Convert to grayscale
-            if len(image.shape) == 3:
-                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = image.copy()
-            
-            logger.debug(f"Processing image with shape: {gray.shape}")
-            
-            # Stage 1: Denoise
-            denoised = cv2.fastNlMeansDenoising(
-                gray, 
+            if len(source.shape) == 3:
+                return cv2.cvtColor(source, cv2.COLOR_BGR2GRAY)
+            return source.copy()
+        if name == 'denoised':
+            return cv2.fastNlMeansDenoising(
+                source, 
                 h=10, 
                 templateWindowSize=7, 
                 searchWindowSize=21
             )
-            logger.debug("Stage 1: Denoising complete")
-            
-            # Stage 2: CLAHE for contrast enhancement
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            enhanced = clahe.apply(denoised)
-            logger.debug("Stage 2: CLAHE enhancement complete")
-            
-            # Stage 3: Deskewing
-            deskewed = PlateImageEnhancer.deskew_image(enhanced)
-            logger.debug("Stage 3: Deskewing complete")
-            
-            # Stage 4: Sharpening
-            sharpened = PlateImageEnhancer.sharpen_image(deskewed)
-            logger.debug("Stage 4: Sharpening complete")
-            
-            # Stage 5: Thresholding (multiple methods)
-            # Otsu's method
-            _, otsu_binary = cv2.threshold(
-                sharpened, 0, 255, 
+        if name == 'enhanced':
+            # CLAHE for contrast enhancement
+            return _clahe(2.0).apply(source)
+        if name == 'deskewed':
+            return PlateImageEnhancer.deskew_image(source)
+        if name == 'sharpened':
+            return PlateImageEnhancer.sharpen_image(source)
+        if name == 'otsu_binary':
+            _, binary = cv2.threshold(
+                source, 0, 255, 
                 cv2.THRESH_BINARY + cv2.THRESH_OTSU
             )
-            
-            # Adaptive thresholding
-            adaptive_binary = cv2.adaptiveThreshold(
-                sharpened, 255, 
+            return binary
+        if name == 'adaptive_binary':
+            return cv2.adaptiveThreshold(
+                source, 255, 
                 cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
                 cv2.THRESH_BINARY, 
                 15, 3
             )
-            logger.debug("Stage 5: Thresholding complete")
-            
-            # Stage 6: Morphological operations
-            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-            otsu_morph = cv2.morphologyEx(otsu_binary, cv2.MORPH_CLOSE, kernel)
-            adaptive_morph = cv2.morphologyEx(adaptive_binary, cv2.MORPH_CLOSE, kernel)
-            logger.debug("Stage 6: Morphological operations complete")
-            
-            results = {
-                'original': gray,
-                'denoised': denoised,
-                'enhanced': enhanced,
-                'deskewed': deskewed,
-                'sharpened': sharpened,
-                'otsu_binary': otsu_binary,
-                'otsu_morph': otsu_morph,
-                'adaptive_binary': adaptive_binary,
-                'adaptive_morph': adaptive_morph,
-            }
-            
-            logger.debug("Advanced enhancement complete")
-            return results
-        
-        except Exception as e:
-            logger.error(f"Error in advanced enhancement: {e}")
-            return None
+        # otsu_morph / adaptive_morph: close small gaps
+        kernel = _structuring_element(cv2.MORPH_RECT, (3, 3))
+        return cv2.morphologyEx(source, cv2.MORPH_CLOSE, kernel)
     
     @staticmethod
     def deskew_image(image: np.ndarray) -> np.ndarray:
@@ -228,13 +368,7 @@ class PlateImageEnhancer:
         """
         try:
             # Unsharp masking kernel
-            kernel = np.array([
-                [-1, -1, -1],
-                [-1,  9 * kernel_strength, -1],
-                [-1, -1, -1]
-            ], dtype=np.float32)
-            
-            sharpened = cv2.filter2D(image, -1, kernel)
+            sharpened = cv2.filter2D(image, -1, _sharpen_kernel(float(kernel_strength)))
             logger.debug(f"Applied sharpening with strength {kernel_strength}")
             return sharpened
         
@@ -291,11 +425,7 @@ class PlateImageEnhancer:
             Contrast-enhanced image
         """
         try:
-            clahe = cv2.createCLAHE(
-                clipLimit=clip_limit, 
-                tileGridSize=(8, 8)
-            )
-            enhanced = clahe.apply(image)
+            enhanced = _clahe(clip_limit).apply(image)
             logger.debug(f"Applied CLAHE with clip_limit={clip_limit}")
             return enhanced
         
@@ -367,10 +497,7 @@ class PlateImageEnhancer:
             Cleaned image
         """
         try:
-            kernel = cv2.getStructuringElement(
-                cv2.MORPH_RECT, 
-                kernel_size
-            )
+            kernel = _structuring_element(cv2.MORPH_RECT, tuple(kernel_size))
             
             # Close (fill small holes)
             closed = cv2.morphologyEx(image, cv2.MORPH_CLOSE, kernel)
@@ -427,9 +554,12 @@ def enhance_plate_image_basic(image: np.ndarray) -> np.ndarray:
     return PlateImageEnhancer.enhance_basic(image)
 
 
-def enhance_plate_image_advanced(image: np.ndarray) -> Dict[str, np.ndarray]:
-    """Full multi-stage enhancement."""
-    return PlateImageEnhancer.enhance_advanced(image)
+def enhance_plate_image_advanced(
+    image: np.ndarray,
+    variants: Optional[Iterable[str]] = None,
+) -> Dict[str, np.ndarray]:
+    """Multi-stage enhancement (all variants, or only the requested ones)."""
+    return PlateImageEnhancer.enhance_advanced(image, variants)
 
 
 def enhance_from_file(
@@ -459,7 +589,7 @@ def enhance_from_file(
         if method == 'basic':
             enhanced = PlateImageEnhancer.enhance_basic(image)
         elif method == 'advanced':
-            results = PlateImageEnhancer.enhance_advanced(image)
+            results = PlateImageEnhancer.enhance_advanced(image, ['enhanced'])
             enhanced = results['enhanced'] if results else image
         else:
             logger.warning(f"Unknown method: {method}, using basic")
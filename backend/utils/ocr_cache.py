@@ -0,0 +1,153 @@
+"""
+OCR Cache
+
+Re-analysis of a video produces the same plate crops again. This module
+keys OCR results by an exact hash of the plate crop's pixels, so a crop
+already read is not read again. Lookups are exact: a perceptual hash
+cannot tell apart plates that differ by one character, and a reading
+returned for the wrong plate would end up in plate lookups and
+unpaid-visit alerts. The cache is size-bounded with LRU eviction and
+persisted as JSON so it survives worker restarts. Several processes (OCR
+workers) may share one file: saving keeps the entries the others wrote
+meanwhile.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from collections import OrderedDict
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(image: np.ndarray) -> int:
+    """
+    Exact hash of an image: 128-bit BLAKE2b of its shape, type and pixels.
+
+    Args:
+        image: Input image
+
+    Returns:
+        Hash as an integer
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f'{image.shape}{image.dtype}'.encode())
+    digest.update(np.ascontiguousarray(image).tobytes())
+    return int.from_bytes(digest.digest(), 'big')
+
+
+class OCRCache:
+    """LRU cache of OCR readings keyed by the content hash of the plate crop."""
+
+    # File format version; files written with perceptual-hash keys are ignored
+    VERSION = 2
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 5000):
+        """
+        Args:
+            path: JSON file to load from and save to (None = memory only)
+            max_entries: Maximum number of cached readings
+        """
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[int, dict]' = OrderedDict()
+        self._dirty = False
+        self.load()
+
+    def get(self, key: int) -> Optional[dict]:
+        """
+        Cached reading for a plate hash.
+
+        Args:
+            key: content_hash of the plate crop
+
+        Returns:
+            Copy of the cached reading, or None on a miss
+        """
+        if key not in self._entries:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return dict(self._entries[key])
+
+    def put(self, key: int, reading: dict) -> None:
+        """Store a reading, evicting the least recently used entries when full."""
+        self._entries[key] = dict(reading)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._dirty = True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _read_file(self) -> list:
+        """[hex key, reading] pairs stored in `path`, oldest first."""
+        if not self.path or not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if not isinstance(data, dict) or data.get('version') != self.VERSION:
+                logger.info(f"Ignoring OCR cache {self.path} written by an older version")
+                return []
+            return [(int(key, 16), reading) for key, reading in data['entries']]
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Ignoring invalid OCR cache {self.path}: {e}")
+            return []
+
+    def load(self) -> None:
+        """Load entries from `path` (missing or invalid file = empty cache)."""
+        entries = self._read_file()
+        for key, reading in entries[-self.max_entries:]:
+            self._entries[key] = reading
+        if entries:
+            logger.info(f"Loaded {len(self._entries)} cached OCR readings from {self.path}")
+
+    def save(self) -> None:
+        """
+        Write entries to `path` (oldest first) if anything changed.
+        Entries saved by other processes since this cache was loaded are
+        kept as the least recently used ones. The read-merge-replace runs
+        under an exclusive lock on `path`.lock, so concurrent saves neither
+        interleave nor drop each other's entries.
+        """
+        if not self.path or not self._dirty:
+            return
+        try:
+            with open(f'{self.path}.lock', 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)  # released when the file is closed
+                saved = [(key, reading) for key, reading in self._read_file() if key not in self._entries]
+                if saved:
+                    merged = OrderedDict(saved)
+                    merged.update(self._entries)
+                    self._entries = merged
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+
+                fd, tmp_path = tempfile.mkstemp(
+                    dir=os.path.dirname(os.path.abspath(self.path)),
+                    prefix=f'{os.path.basename(self.path)}.', suffix='.tmp',
+                )
+                try:
+                    with os.fdopen(fd, 'w') as f:
+                        json.dump({
+                            'version': self.VERSION,
+                            'entries': [[f'{key:x}', reading] for key, reading in self._entries.items()],
+                        }, f, ensure_ascii=False)
+                    os.replace(tmp_path, self.path)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+            self._dirty = False
+        except OSError as e:
+            logger.warning(f"Could not save OCR cache {self.path}: {e}")
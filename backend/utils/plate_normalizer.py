@@ -0,0 +1,53 @@
+"""
+License Plate Normalization
+
+The same plate is written in different ways: typed by staff ("ABC-123",
+"أبج1234"), or read by OCR with spaces between the letters ("أ ب ج 1234"),
+Arabic-Indic digits or variant letter forms. normalize_plate() folds all of
+them into one canonical key that is stored (indexed) next to the plate so
+lookups are plain equality matches in the database.
+"""
+
+import re
+import unicodedata
+
+# Arabic-Indic (٠-٩) and Extended Arabic-Indic / Persian (۰-۹) digits -> 0-9
+_DIGITS = {0x0660 + i: str(i) for i in range(10)}
+_DIGITS.update({0x06F0 + i: str(i) for i in range(10)})
+
+# Letter variants that OCR and keyboards mix up -> one base letter
+_LETTER_VARIANTS = {
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ی': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه', 'ۀ': 'ه', 'ہ': 'ه',
+    'ک': 'ك',
+}
+
+_TRANSLATION = str.maketrans({**_DIGITS, **{ord(k): v for k, v in _LETTER_VARIANTS.items()}})
+
+# Harakat, superscript alef and tatweel carry no plate information
+_MARKS_RE = re.compile('[\u064B-\u065F\u0670\u0640]')
+
+
+def normalize_plate(text: str) -> str:
+    """
+    Canonical key of a license plate.
+
+    Unicode compatibility forms (Arabic presentation forms, full-width
+    characters) are folded, digits are converted to 0-9, Arabic letter
+    variants to their base letter, Latin letters to upper case, and
+    everything that is not a letter or digit (spaces, dashes, diacritics)
+    is dropped.
+
+    Args:
+        text: Plate as typed or read by OCR (None allowed)
+
+    Returns:
+        Normalized key, '' for an empty plate
+    """
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', text)
+    text = _MARKS_RE.sub('', text).translate(_TRANSLATION).upper()
+    return ''.join(ch for ch in text if ch.isalnum())
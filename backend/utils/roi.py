@@ -0,0 +1,163 @@
+"""
+Camera Region-of-Interest Utilities
+
+Each camera sees more than the pump lanes (street, shop). A region of
+interest (ROI) per camera limits vehicle detection to the lanes: frames are
+cropped to the ROI's bounding box and masked outside its polygons before
+detection, and detections whose center falls outside the ROI are dropped.
+
+ROIs are read from a JSON file that maps video filename patterns to
+polygons and/or rectangles, in fractions (0-1) of the frame size:
+
+    {
+        "1_*": {"rectangles": [[0.0, 0.3, 0.6, 1.0]]},
+        "2_*": {"polygons": [[[0.1, 0.4], [0.9, 0.4], [1.0, 1.0], [0.0, 1.0]]]}
+    }
+
+The first pattern matching a video's filename wins.
+"""
+
+import fnmatch
+import json
+import os
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RegionOfInterest:
+    """
+    Union of polygons in normalized (0-1) frame coordinates.
+
+    Pixel geometry (mask and bounding box) is computed once per frame size.
+    """
+
+    def __init__(self, polygons: List[Sequence[Sequence[float]]]):
+        """
+        Args:
+            polygons: List of polygons, each a list of (x, y) fractions
+        """
+        self.polygons = [np.asarray(p, dtype=np.float64).reshape(-1, 2) for p in polygons if len(p) >= 3]
+        if not self.polygons:
+            raise ValueError("ROI needs at least one polygon or rectangle")
+        for polygon in self.polygons:
+            inside = np.clip(polygon, 0, 1).astype(np.float32)
+            if cv2.contourArea(inside) <= 0:
+                raise ValueError(f"ROI polygon {polygon.tolist()} covers no area of the frame (0-1 fractions)")
+        self._geometry: Dict[Tuple[int, int], dict] = {}
+
+    @classmethod
+    def from_config(cls, entry: dict) -> 'RegionOfInterest':
+        """
+        Build an ROI from a config entry.
+
+        Args:
+            entry: Dict with 'polygons' ([[x, y], ...] lists) and/or
+                'rectangles' ([x1, y1, x2, y2] lists)
+        """
+        polygons = list(entry.get('polygons', []))
+        for x1, y1, x2, y2 in entry.get('rectangles', []):
+            polygons.append([[x1, y1], [x2, y1], [x2, y2], [x1, y2]])
+        return cls(polygons)
+
+    def geometry(self, shape: Tuple[int, ...]) -> dict:
+        """
+        Pixel mask and bounding box of the ROI for a frame shape.
+
+        Returns:
+            Dict with 'mask' (full-frame uint8), 'bounds' (x1, y1, x2, y2),
+            'crop_mask' (mask inside bounds, None if fully inside) and 'fraction'
+            (share of the frame covered)
+
+        Raises:
+            ValueError: If the ROI covers no pixel of the frame
+        """
+        h, w = shape[:2]
+        geometry = self._geometry.get((h, w))
+        if geometry is not None:
+            return geometry
+
+        mask = np.zeros((h, w), dtype=np.uint8)
+        for polygon in self.polygons:
+            points = np.round(polygon * [w, h]).astype(np.int32)
+            cv2.fillPoly(mask, [points], 255)
+
+        ys, xs = np.nonzero(mask)
+        if len(xs) == 0:
+            raise ValueError(f"ROI covers no pixel of a {w}x{h} frame")
+        bounds = (int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+        x1, y1, x2, y2 = bounds
+        crop_mask = mask[y1:y2, x1:x2]
+
+        geometry = {
+            'mask': mask,
+            'bounds': bounds,
+            'crop_mask': None if crop_mask.all() else crop_mask,
+            'fraction': float(np.count_nonzero(mask)) / max(1, h * w),
+        }
+        self._geometry[(h, w)] = geometry
+        return geometry
+
+    def crop(self, frame: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """
+        Crop a frame to the ROI's bounding box and black out pixels outside it.
+
+        Returns:
+            (cropped image, (x offset, y offset) of the crop in the frame)
+        """
+        geometry = self.geometry(frame.shape)
+        x1, y1, x2, y2 = geometry['bounds']
+        image = frame[y1:y2, x1:x2]
+        if geometry['crop_mask'] is not None:
+            image = cv2.bitwise_and(image, image, mask=geometry['crop_mask'])
+        return image, (x1, y1)
+
+    def contains(self, x: float, y: float, shape: Tuple[int, ...]) -> bool:
+        """Whether pixel (x, y) of a frame with `shape` lies inside the ROI."""
+        mask = self.geometry(shape)['mask']
+        h, w = mask.shape
+        xi, yi = int(x), int(y)
+        return 0 <= xi < w and 0 <= yi < h and mask[yi, xi] > 0
+
+
+def load_roi_config(path: Optional[str]) -> List[Tuple[str, RegionOfInterest]]:
+    """
+    Load camera ROIs from a JSON file.
+
+    Args:
+        path: Path to the ROI config (None or missing file = no ROIs)
+
+    Returns:
+        List of (filename pattern, RegionOfInterest), in file order
+    """
+    if not path or not os.path.exists(path):
+        return []
+
+    try:
+        with open(path) as f:
+            config = json.load(f)
+        return [(pattern, RegionOfInterest.from_config(entry)) for pattern, entry in config.items()]
+    except (OSError, ValueError, TypeError) as e:
+        logger.error(f"Invalid ROI config {path}: {e}")
+        return []
+
+
+def roi_for_video(rois: List[Tuple[str, RegionOfInterest]], video_name: str) -> Optional[RegionOfInterest]:
+    """
+    ROI of the camera that recorded a video.
+
+    Args:
+        rois: Output of load_roi_config
+        video_name: Video filename (or path; only the basename is matched)
+
+    Returns:
+        The first ROI whose pattern matches, or None (use the full frame)
+    """
+    name = os.path.basename(video_name)
+    for pattern, roi in rois:
+        if fnmatch.fnmatch(name, pattern):
+            return roi
+    return None
@@ -0,0 +1,211 @@
+"""
+Multi-Object Tracking for Video Analysis
+
+A lightweight SORT-style tracker in pure NumPy. Detections of consecutive
+sampled frames are associated to tracks first by IoU against each track's
+constant-velocity prediction, then by centroid distance for fast movers
+whose boxes no longer overlap. Each vehicle keeps one track ID across the
+video, so it is counted once and its best frames can be picked per track.
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    Pairwise IoU of two sets of boxes.
+
+    Args:
+        boxes_a: (N, 4) array of x1, y1, x2, y2
+        boxes_b: (M, 4) array of x1, y1, x2, y2
+
+    Returns:
+        (N, M) IoU matrix
+    """
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def _greedy_match(
+    scores: np.ndarray,
+    threshold: float,
+    higher_is_better: bool = True,
+) -> List[Tuple[int, int]]:
+    """Greedy one-to-one assignment of rows to columns by score."""
+    pairs = []
+    if scores.size == 0:
+        return pairs
+
+    order = np.argsort(-scores if higher_is_better else scores, axis=None)
+    used_rows, used_cols = set(), set()
+    for flat in order:
+        row, col = np.unravel_index(flat, scores.shape)
+        value = scores[row, col]
+        if (higher_is_better and value < threshold) or (not higher_is_better and value > threshold):
+            break
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        pairs.append((int(row), int(col)))
+    return pairs
+
+
+class IoUTracker:
+    """
+    IoU + centroid tracker over sampled frames.
+
+    Each track has an ID, its last box and a per-frame velocity, so the
+    prediction holds when the sampling rate varies. Tracks that are not
+    matched for more than `max_age` sampled frames are closed.
+    `spans` records the first and last box of every track ever created.
+    Closed track IDs are collected until pop_closed() is called, so their
+    final results can be processed while tracking goes on.
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = 0.3,
+        max_distance: float = 0.75,
+        max_age: int = 3,
+        first_id: int = 1,
+    ):
+        """
+        Args:
+            iou_threshold: Minimum IoU with the predicted box to match
+            max_distance: Maximum centroid distance (fraction of the predicted
+                box diagonal) for the fallback match
+            max_age: Sampled frames a track survives without a match
+            first_id: First track ID to hand out
+        """
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.next_id = first_id
+        self.tracks: Dict[int, dict] = {}
+        self.spans: Dict[int, dict] = {}
+        self.closed: List[int] = []
+
+    def update(self, boxes, frame_idx: int) -> List[int]:
+        """
+        Associate one sampled frame's detections to tracks.
+
+        Args:
+            boxes: (N, 4) detections as x1, y1, x2, y2
+            frame_idx: Index of the frame in the video
+
+        Returns:
+            Track ID for each detection, in input order
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        track_ids = list(self.tracks)
+        predicted = np.array([
+            self.tracks[t]['bbox'] + self.tracks[t]['velocity'] * (frame_idx - self.tracks[t]['frame'])
+            for t in track_ids
+        ]).reshape(-1, 4)
+
+        assigned: List[Optional[int]] = [None] * len(boxes)
+        unmatched_tracks = list(range(len(track_ids)))
+        unmatched_boxes = list(range(len(boxes)))
+
+        # Stage 1: IoU with the predicted box
+        if len(track_ids) and len(boxes):
+            ious = iou_matrix(predicted, boxes)
+            for row, col in _greedy_match(ious, self.iou_threshold):
+                assigned[col] = track_ids[row]
+            unmatched_tracks = [r for r in unmatched_tracks if track_ids[r] not in assigned]
+            unmatched_boxes = [c for c in unmatched_boxes if assigned[c] is None]
+
+        # Stage 2: centroid distance for boxes that moved too far to overlap
+        if unmatched_tracks and unmatched_boxes:
+            pred = predicted[unmatched_tracks]
+            dets = boxes[unmatched_boxes]
+            pred_c = (pred[:, :2] + pred[:, 2:]) / 2
+            det_c = (dets[:, :2] + dets[:, 2:]) / 2
+            diag = np.hypot(pred[:, 2] - pred[:, 0], pred[:, 3] - pred[:, 1])
+            dist = np.linalg.norm(pred_c[:, None, :] - det_c[None, :, :], axis=2) / np.maximum(diag[:, None], 1e-9)
+            for row, col in _greedy_match(dist, self.max_distance, higher_is_better=False):
+                assigned[unmatched_boxes[col]] = track_ids[unmatched_tracks[row]]
+
+        for i, track_id in enumerate(assigned):
+            if track_id is None:
+                track_id = self.next_id
+                self.next_id += 1
+                assigned[i] = track_id
+                self.tracks[track_id] = {'bbox': boxes[i], 'velocity': np.zeros(4), 'frame': frame_idx, 'misses': 0}
+                self.spans[track_id] = {'first_frame': frame_idx, 'first_bbox': boxes[i].tolist()}
+            else:
+                track = self.tracks[track_id]
+                track['velocity'] = (boxes[i] - track['bbox']) / max(1, frame_idx - track['frame'])
+                track['bbox'] = boxes[i]
+                track['frame'] = frame_idx
+                track['misses'] = 0
+            self.spans[track_id].update({'last_frame': frame_idx, 'last_bbox': boxes[i].tolist()})
+
+        matched = set(assigned)
+        for track_id in track_ids:
+            if track_id in matched:
+                continue
+            track = self.tracks[track_id]
+            track['misses'] += 1
+            if track['misses'] > self.max_age:
+                del self.tracks[track_id]
+                self.closed.append(track_id)
+
+        return assigned
+
+    def pop_closed(self) -> List[int]:
+        """IDs of the tracks closed since the last call."""
+        closed, self.closed = self.closed, []
+        return closed
+
+
+def link_track_spans(
+    prev_spans: Dict[str, dict],
+    next_spans: Dict[str, dict],
+    boundary_frame: int,
+    max_gap: int,
+    iou_threshold: float = 0.3,
+) -> Dict[str, str]:
+    """
+    Link tracks that continue across a segment boundary.
+
+    A track of the previous segment that ends within `max_gap` frames before
+    the boundary is linked to a track of the next segment that starts within
+    `max_gap` frames after it when their boxes overlap.
+
+    Args:
+        prev_spans: Track spans of the segment before the boundary
+        next_spans: Track spans of the segment after the boundary
+        boundary_frame: First frame of the next segment
+        max_gap: Maximum frame distance from the boundary
+        iou_threshold: Minimum IoU between last and first box
+
+    Returns:
+        Mapping of next-segment track key to previous-segment track key
+    """
+    ending = [k for k, s in prev_spans.items() if boundary_frame - s['last_frame'] <= max_gap]
+    starting = [k for k, s in next_spans.items() if s['first_frame'] - boundary_frame <= max_gap]
+    if not ending or not starting:
+        return {}
+
+    ious = iou_matrix(
+        [prev_spans[k]['last_bbox'] for k in ending],
+        [next_spans[k]['first_bbox'] for k in starting],
+    )
+    return {starting[col]: ending[row] for row, col in _greedy_match(ious, iou_threshold)}
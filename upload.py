@@ -52,23 +52,29 @@ def upload_video(video_path: str, plate: str = ""):
         print(f"\n ALERT: {alert['message']}")
         print()
 
-    # Step 2: Wait for background analysis
+    # Step 2: Wait for background analysis, until it is done or failed
     print(" Waiting for YOLO analysis to complete...")
-    for i in range(120):  # Wait up to 10 minutes
+    for i in range(360):  # Give up after 30 minutes
         time.sleep(5)
         try:
             status_resp = requests.get(f"{API_URL}/api/cars/analysis_status/?car_id={car_id}", timeout=10)
             if status_resp.status_code == 200:
                 status_data = status_resp.json()
-                if status_data.get("analyzed"):
+                state = status_data.get("state")
+                if state == "done":
                     elapsed = time.time() - start
                     print(f"\n Analysis complete in {elapsed:.0f}s!")
                     print(f"    Vehicles detected: {status_data['vehicle_count']}")
                     return result
+                if state == "failed":
+                    print(f"\n Analysis failed: {status_data.get('error')}")
+                    sys.exit(1)
+                if state == "running":
+                    stage = status_data.get("stage") or "starting"
+                    print(f"    Analyzing: {status_data['progress']:3d}% ({stage}, {(i + 1) * 5}s)   ", end="\r")
                 else:
-                    dots = "." * ((i % 3) + 1)
-                    print(f"    Analyzing{dots} ({(i + 1) * 5}s)", end="\r")
-        except Exception:
+                    print(f"    Queued ({(i + 1) * 5}s)   ", end="\r")
+        except requests.RequestException:
             pass
 
     print("\n Analysis timeout — it may still be running in the background.")